@@ -1,21 +1,77 @@
-import logging
+import os
+from functools import partial
 from logging import getLogger
-from logging.handlers import RotatingFileHandler
 
-from flask import Flask
+import orjson
+from flask import Flask, Response, g, stream_with_context
 from flask_cors import CORS
 
+from api import limiter, logs, metrics
+from api.utils import InvalidParameterError
+
 LOGGER = getLogger(__name__)
-handler = RotatingFileHandler('./log/api.log', maxBytes=1000000, backupCount=3)
-formatter = logging.Formatter('%(asctime)s [%(name)s] %(levelname)s: %(message)s')
-handler.setFormatter(formatter)
-LOGGER.addHandler(handler)
+logs.setup(LOGGER)
 
 app = Flask(__name__)
 CORS(app)
 app.config['JSON_AS_ASCII'] = False
 app.config['CORS_HEADERS'] = 'Content-Type'
+# add Server-Timing header with the stage breakdown to every response
+app.config['SERVER_TIMING'] = os.environ.get('POLITYLINK_SERVER_TIMING', 'false') == 'true'
+
+
+@app.before_request
+def start_request():
+    metrics.start_request()
+    limiter.acquire()
+
+
+@app.after_request
+def finish_response(response):
+    g.status = response.status_code
+    if app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = metrics.build_server_timing()
+    if g.get('streamed', False):
+        # the server closes the response after the last chunk, or when the client disconnects before it
+        response.call_on_close(partial(finish_request, g._get_current_object(), logs.get_request_info()))
+    return response
+
+
+@app.teardown_request
+def end_request(exc):
+    if not g.get('streamed', False):
+        finish_request(g._get_current_object(), logs.get_request_info())
+
+
+def finish_request(state, request_info):
+    duration = metrics.end_request(state)
+    limiter.release(state)
+    if duration is not None:
+        logs.log_access(duration, state, request_info)
+
+
+def stream_response(chunks, **kwargs):
+    """
+    chunksを順に返すResponseを作る。リクエストの計測とlimiterの解放はresponseが閉じられた時に行う。
+    """
+
+    g.streamed = True
+    return Response(stream_with_context(chunks), **kwargs)
+
+
+@app.errorhandler(limiter.OverloadedError)
+def handle_overloaded(e):
+    return orjson.dumps({'error': str(e)}), e.status, {'Retry-After': '1'}
+
+
+@app.errorhandler(InvalidParameterError)
+def handle_invalid_parameter(e):
+    return orjson.dumps({'error': str(e)}), 400
+
 
 import api.wordcloud
 import api.bill
 import api.member
+import api.batch
+import api.suggest
+import api.health
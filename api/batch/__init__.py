@@ -0,0 +1,53 @@
+import orjson
+from flask import request
+from flask_cors import cross_origin
+from werkzeug.datastructures import MultiDict
+
+import api.bill
+import api.member
+import api.wordcloud
+from api import app
+from api.batch.search import MAX_QUERIES, search_batch
+from api.metrics import stage
+from api.utils import InvalidParameterError
+
+
+@app.route('/batch', methods=['POST'])
+@cross_origin()
+def batch_api():
+    """
+    {"queries": [{"type": "bills", "params": {"q": "...", "category": [0, 1]}}, ...]} の形式で複数の検索を受け取る。
+    paramsは/bills, /membersのクエリパラメータ、/searchのJSONと同じ。
+    """
+
+    queries = []
+    if len(request.json.get('queries', [])) > MAX_QUERIES:
+        raise InvalidParameterError(f'too many queries (max {MAX_QUERIES})')
+    for query in request.json.get('queries', []):
+        query_type, params = query.get('type'), query.get('params', dict())
+        if query_type == 'bills':
+            queries.append((query_type, api.bill.parse_search_params(to_multi_dict(params))))
+        elif query_type == 'members':
+            queries.append((query_type, api.member.parse_search_params(to_multi_dict(params))))
+        elif query_type == 'search':
+            queries.append((query_type, api.wordcloud.parse_search_params(params)))
+        else:
+            raise InvalidParameterError(f'unknown query type: {query_type}')
+    app.logger.info('search batch: %s', queries)
+    responses = search_batch(queries)
+    with stage('serialize'):
+        return orjson.dumps(responses)
+
+
+def to_multi_dict(params):
+    """
+    JSONのparamsをrequest.argsと同じ形式に変換する
+    """
+
+    items = []
+    for key, values in params.items():
+        for value in (values if isinstance(values, list) else [values]):
+            if isinstance(value, bool):
+                value = 'true' if value else 'false'
+            items.append((key, str(value)))
+    return MultiDict(items)
@@ -0,0 +1,90 @@
+import logging
+
+from elasticsearch_dsl import MultiSearch
+from politylink.elasticsearch.schema import BillText, MemberText
+
+import api.bill.search as bill_search
+import api.member.search as member_search
+import api.wordcloud.search as speech_search
+from api.client import es_client, executor
+from api.facet import build_facets
+from api.metrics import stage, submit
+from api.pagination import MAX_TOTAL_HITS, paginate, build_next_cursor, point_in_times
+from api.utils import InvalidParameterError
+
+LOGGER = logging.getLogger(__name__)
+QUERY_TYPES = ['bills', 'members', 'search']
+MAX_QUERIES = 20
+QUERY_TYPE2INDEX = {'bills': BillText.index, 'members': MemberText.index}
+
+
+def search_batch(queries):
+    """
+    複数の検索を1回の_msearchで実行し、GraphQLへの問い合わせもエンティティの種類ごとに1回にまとめる。
+
+    :param queries: (query_type, kwargs) のリスト。kwargsはsearch_bills, search_members, search_speechの引数
+    :return: queriesと同じ順序のレスポンスのリスト
+    """
+
+    # first cursor pages need a point in time of their index, which are opened concurrently before the _msearch
+    indices = set(QUERY_TYPE2INDEX[query_type] for query_type, kwargs in queries
+                  if query_type in QUERY_TYPE2INDEX and kwargs['cursor'] == '')
+    for future in [submit(executor, 'elasticsearch', point_in_times.get, index) for index in indices]:
+        future.result()
+
+    ms = MultiSearch(using=es_client.client)
+    for query_type, kwargs in queries:
+        ms = ms.add(build_search(query_type, kwargs))
+
+    with stage('elasticsearch'):
+        es_responses = ms.execute()
+
+    type2ids = dict((query_type, []) for query_type in QUERY_TYPES)
+    for (query_type, _), es_response in zip(queries, es_responses):
+        type2ids[query_type] += [hit.id for hit in es_response.hits]
+
+    futures = {
+        'bills': submit(executor, 'graphql', bill_search.bill_cache.get_or_fetch, type2ids['bills'],
+                        bill_search.fetch_gql_bill_info_map),
+        'members': submit(executor, 'graphql', member_search.member_cache.get_or_fetch, type2ids['members'],
+                          member_search.fetch_gql_member_info_map),
+        'search': submit(executor, 'graphql', speech_search.speech_cache.get_or_fetch, type2ids['search'],
+                         speech_search.fetch_gql_speech_info_map)
+    }
+    type2info_map = dict((query_type, future.result()) for query_type, future in futures.items())
+
+    with stage('build'):
+        return [build_response(query_type, kwargs, es_response, type2info_map[query_type])
+                for (query_type, kwargs), es_response in zip(queries, es_responses)]
+
+
+def build_search(query_type, kwargs):
+    if query_type == 'bills':
+        s, sort_fields = bill_search.build_search(
+            kwargs['query'], kwargs['categories'], kwargs['statuses'], kwargs['belonged_to_diets'],
+            kwargs['submitted_diets'], kwargs['submitted_groups'], kwargs['supported_groups'],
+            kwargs['opposed_groups'], kwargs['full_text'], kwargs['fragment_size'], kwargs['facets'])
+        s = s.extra(track_total_hits=MAX_TOTAL_HITS)
+        return paginate(s, BillText.index, sort_fields, kwargs['page'], kwargs['num_items'], kwargs['cursor'])
+    elif query_type == 'members':
+        s, sort_fields = member_search.build_search(
+            kwargs['query'], kwargs['groups'], kwargs['houses'], kwargs['fragment_size'], kwargs['facets'])
+        s = s.extra(track_total_hits=MAX_TOTAL_HITS)
+        return paginate(s, MemberText.index, sort_fields, kwargs['page'], kwargs['num_items'], kwargs['cursor'])
+    elif query_type == 'search':
+        return speech_search.build_search(**kwargs)
+    raise InvalidParameterError(f'unknown query type: {query_type}')
+
+
+def build_response(query_type, kwargs, es_response, info_map):
+    if query_type == 'search':
+        return speech_search.build_response(es_response.hits, info_map)
+
+    module = bill_search if query_type == 'bills' else member_search
+    hit_records = [module.build_hit_record(hit, kwargs['fragment_size']) for hit in es_response.hits]
+    response = module.build_response(es_response.hits, hit_records, info_map, es_response.hits.total.value)
+    if kwargs['facets']:
+        response['facets'] = build_facets(es_response, module.FACETS, kwargs['facets'])
+    if kwargs['cursor'] is not None:
+        response['nextCursor'] = build_next_cursor(es_response, kwargs['num_items'])
+    return response
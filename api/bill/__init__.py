@@ -2,29 +2,63 @@ import orjson
 from flask import request
 from flask_cors import cross_origin
 
-from api import app
-from api.bill.search import search_bills
+from api import app, stream_response
+from api.bill.search import search_bills, export_bills
+from api.cache import ResponseCache, build_cache_key
+from api.metrics import stage
+
+response_cache = ResponseCache('bills')
 
 
 @app.route('/bills', methods=['GET'])
 @cross_origin()
 def get_bills_api():
-    kwargs = {
-        # query param
-        'query': request.args.get('q'),
-        'categories': request.args.getlist('category', lambda x: int(x)),
-        'statuses': request.args.getlist('status', lambda x: int(x)),
-        'belonged_to_diets': request.args.getlist('diet', lambda x: int(x)),
-        'submitted_diets': request.args.getlist('sdiet', lambda x: int(x)),
-        'submitted_groups': request.args.getlist('sbgroup', lambda x: int(x)),
-        'supported_groups': request.args.getlist('spgroup', lambda x: int(x)),
-        'opposed_groups': request.args.getlist('opgroup', lambda x: int(x)),
-        'full_text': request.args.get('full', 'false') == 'true',
+    kwargs = parse_search_params(request.args)
+    app.logger.info('search bills: %s', kwargs)
+    if kwargs['cursor'] is not None:
+        # the next cursor holds a point in time, which must not outlive its keep alive in the cache
+        return serialize(search_bills(**kwargs))
+    return response_cache.get_or_compute(build_cache_key(kwargs), lambda: serialize(search_bills(**kwargs)))
+
+
+@app.route('/bills/export', methods=['GET'])
+@cross_origin()
+def export_bills_api():
+    kwargs = parse_query_params(request.args)
+    kwargs['fragment_size'] = int(request.args.get('fragment', 100))
+    app.logger.info('export bills: %s', kwargs)
+    records = export_bills(**kwargs)
+    return stream_response((orjson.dumps(record) + b'\n' for record in records),
+                           mimetype='application/x-ndjson')
+
+
+def serialize(response):
+    with stage('serialize'):
+        return orjson.dumps(response)
+
+
+def parse_search_params(args):
+    kwargs = parse_query_params(args)
+    kwargs.update({
         # response param
-        'page': int(request.args.get('page', 1)),
-        'num_items': int(request.args.get('items', 3)),
-        'fragment_size': int(request.args.get('fragment', 100))
+        'page': int(args.get('page', 1)),
+        'num_items': int(args.get('items', 3)),
+        'fragment_size': int(args.get('fragment', 100)),
+        'cursor': args.get('cursor'),
+        'facets': args.getlist('facet')
+    })
+    return kwargs
+
+
+def parse_query_params(args):
+    return {
+        'query': args.get('q'),
+        'categories': args.getlist('category', lambda x: int(x)),
+        'statuses': args.getlist('status', lambda x: int(x)),
+        'belonged_to_diets': args.getlist('diet', lambda x: int(x)),
+        'submitted_diets': args.getlist('sdiet', lambda x: int(x)),
+        'submitted_groups': args.getlist('sbgroup', lambda x: int(x)),
+        'supported_groups': args.getlist('spgroup', lambda x: int(x)),
+        'opposed_groups': args.getlist('opgroup', lambda x: int(x)),
+        'full_text': args.get('full', 'false') == 'true',
     }
-    app.logger.info(f'search bills: {kwargs}')
-    response = search_bills(**kwargs)
-    return orjson.dumps(response)
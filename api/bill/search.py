@@ -1,26 +1,98 @@
 import logging
 
 import stringcase
-import time
 from elasticsearch_dsl import Search, AttrList
 
-from politylink.elasticsearch.client import ElasticsearchClient
-from politylink.elasticsearch.schema import BillText, BillStatus
-from politylink.graphql.client import GraphQLClient
+from politylink.elasticsearch.schema import BillText, BillStatus, BillCategory, ParliamentaryGroup
 from politylink.utils.bill import extract_bill_number_or_none
 
+from api.cache import EntityCache
+from api.client import es_client, gql_client, executor
+from api.facet import Facet, apply_filters, build_facets
+from api.metrics import iter_stage, stage, submit
+from api.pagination import MAX_TOTAL_HITS, paginate, build_next_cursor
+from api.utils import iter_batches
+
 LOGGER = logging.getLogger(__name__)
-es_client = ElasticsearchClient()
-gql_client = GraphQLClient(url='https://graphql.politylink.jp')
+bill_cache = EntityCache('bill')
 
 GQL_FIELDS = ['id', 'name', 'bill_number', 'category', 'tags', 'total_news', 'total_minutes', 'urls']
 ES_FIELDS = [BillText.Field.SUBMITTED_DATE, BillText.Field.LAST_UPDATED_DATE,
              BillText.Field.SUBMITTED_DIET, BillText.Field.BELONGED_TO_DIETS]
+EXPORT_BATCH_SIZE = 500
+# keys are the names of the query parameters
+FACETS = {
+    'category': Facet(BillText.Field.CATEGORY.value, lambda x: BillCategory.from_index(x).label),
+    'status': Facet(BillText.Field.STATUS.value, lambda x: BillStatus.from_index(x).label),
+    'diet': Facet(BillText.Field.BELONGED_TO_DIETS.value, None),
+    'sdiet': Facet(BillText.Field.SUBMITTED_DIET.value, None),
+    'sbgroup': Facet(BillText.Field.SUBMITTED_GROUPS.value, lambda x: ParliamentaryGroup.from_index(x).label),
+    'spgroup': Facet(BillText.Field.SUPPORTED_GROUPS.value, lambda x: ParliamentaryGroup.from_index(x).label),
+    'opgroup': Facet(BillText.Field.OPPOSED_GROUPS.value, lambda x: ParliamentaryGroup.from_index(x).label),
+}
 
 
 def search_bills(query: str, categories=None, statuses=None, belonged_to_diets=None, submitted_diets=None,
                  submitted_groups=None, supported_groups=None, opposed_groups=None,
-                 full_text=False, page: int = 1, num_items: int = 3, fragment_size: int = 100):
+                 full_text=False, page: int = 1, num_items: int = 3, fragment_size: int = 100, cursor: str = None,
+                 facets=()):
+    """
+    :param facets: 値ごとの件数を返すフィルタ(FACETSのkey)のリスト
+    """
+
+    s, sort_fields = build_search(query, categories, statuses, belonged_to_diets, submitted_diets,
+                                  submitted_groups, supported_groups, opposed_groups, full_text, fragment_size, facets)
+    s = paginate(s, BillText.index, sort_fields, page, num_items, cursor)
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug('search: %s', s.to_dict())
+
+    with stage('elasticsearch'):
+        es_response = s.extra(track_total_hits=MAX_TOTAL_HITS).execute()
+
+    gql_future = submit(executor, 'graphql', bill_cache.get_or_fetch, [hit.id for hit in es_response.hits],
+                        fetch_gql_bill_info_map)
+    with stage('build'):
+        hit_records = [build_hit_record(hit, fragment_size) for hit in es_response.hits]
+    bill_info_map = gql_future.result()
+
+    response = build_response(es_response.hits, hit_records, bill_info_map, es_response.hits.total.value)
+    if facets:
+        response['facets'] = build_facets(es_response, FACETS, facets)
+    if cursor is not None:
+        response['nextCursor'] = build_next_cursor(es_response, num_items)
+    return response
+
+
+def export_bills(query: str, categories=None, statuses=None, belonged_to_diets=None, submitted_diets=None,
+                 submitted_groups=None, supported_groups=None, opposed_groups=None,
+                 full_text=False, fragment_size: int = 100, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    条件に一致する全ての法案をscrollで取得し、batch_size件ごとにGraphQLで一括取得したレコードを順に返す
+    """
+
+    s, _ = build_search(query, categories, statuses, belonged_to_diets, submitted_diets,
+                        submitted_groups, supported_groups, opposed_groups, full_text, fragment_size)
+    s = s.params(size=batch_size)
+    for hits in iter_stage('elasticsearch', iter_batches(s.scan(), batch_size)):
+        # bypass bill_cache so that a full export does not evict the entries of popular bills
+        gql_future = submit(executor, 'graphql', fetch_gql_bill_info_map, [hit.id for hit in hits])
+        with stage('build'):
+            hit_records = [build_hit_record(hit, fragment_size) for hit in hits]
+        bill_info_map = gql_future.result()
+        for hit, hit_record in zip(hits, hit_records):
+            if hit.id in bill_info_map:
+                yield build_bill_record(hit, bill_info_map[hit.id], hit_record)
+            else:
+                LOGGER.warning('failed to fetch %s from GraphQL', hit.id)
+
+
+def build_search(query: str, categories=None, statuses=None, belonged_to_diets=None, submitted_diets=None,
+                 submitted_groups=None, supported_groups=None, opposed_groups=None,
+                 full_text=False, fragment_size: int = 100, facets=()):
+    """
+    ページング前のSearchと、そのソート順を返す。facetsのaggregationも追加する。
+    """
+
     s = Search(using=es_client.client, index=BillText.index) \
         .source(excludes=[BillText.Field.BODY, BillText.Field.SUPPLEMENT])
     if query:
@@ -39,61 +111,51 @@ def search_bills(query: str, categories=None, statuses=None, belonged_to_diets=N
                            boundary_chars='.,!? \t\n、。',
                            fragment_size=fragment_size, number_of_fragments=1,
                            pre_tags=['<b>'], post_tags=['</b>'])
+        sort_fields = ['_score']
     else:
-        s = s.sort('-' + BillText.Field.LAST_UPDATED_DATE)
-
-    if categories:
-        s = s.filter('terms', category=categories)
-    if statuses:
-        s = s.filter('terms', status=statuses)
-    if belonged_to_diets:
-        s = s.filter('terms', belonged_to_diets=belonged_to_diets)
-    if submitted_diets:
-        s = s.filter('terms', submitted_diet=submitted_diets)
-    if submitted_groups:
-        s = s.filter('terms', submitted_groups=submitted_groups)
-    if supported_groups:
-        s = s.filter('terms', supported_groups=supported_groups)
-    if opposed_groups:
-        s = s.filter('terms', opposed_groups=opposed_groups)
-
-    idx_from = (page - 1) * num_items
-    idx_to = page * num_items
-    s = s[idx_from: idx_to]
-    LOGGER.debug(s.to_dict())
-
-    start_time_ms = time.time() * 1000
-    es_response = s.execute()
-    end_time_ms = time.time() * 1000
-    LOGGER.debug(f'took {end_time_ms - start_time_ms} for elasticsearch')
-
-    start_time_ms = time.time() * 1000
-    bill_info_map = fetch_gql_bill_info_map([hit.id for hit in es_response.hits])
-    end_time_ms = time.time() * 1000
-    LOGGER.debug(f'took {end_time_ms - start_time_ms} for GraphQL')
-
-    return build_response(es_response, bill_info_map, fragment_size)
-
-
-def build_response(es_response, bill_info_map, fragment_size):
+        sort_fields = ['-' + BillText.Field.LAST_UPDATED_DATE]
+        s = s.sort(*sort_fields)
+
+    s = apply_filters(s, FACETS, {
+        'category': categories,
+        'status': statuses,
+        'diet': belonged_to_diets,
+        'sdiet': submitted_diets,
+        'sbgroup': submitted_groups,
+        'spgroup': supported_groups,
+        'opgroup': opposed_groups
+    }, facets)
+    return s, sort_fields
+
+
+def build_response(hits, hit_records, bill_info_map, total):
     bill_records = []
-    for hit in es_response.hits:
+    for hit, hit_record in zip(hits, hit_records):
         bill_id = hit.id
         if bill_id in bill_info_map:
             bill_info = bill_info_map.get(bill_id)
-            bill_records.append(build_bill_record(hit, bill_info, fragment_size))
+            bill_records.append(build_bill_record(hit, bill_info, hit_record))
         else:
-            LOGGER.warning(f'failed to fetch {bill_id} from GraphQL')
+            LOGGER.warning('failed to fetch %s from GraphQL', bill_id)
     return {
-        'totalBills': es_response.hits.total.value,
+        'totalBills': total,
         'bills': bill_records
     }
 
 
-def build_bill_record(hit, bill_info, fragment_size):
+def build_bill_record(hit, bill_info, hit_record):
     record = {'id': hit.id}
     record.update(bill_info)
+    record.update(hit_record)
+    return record
+
+
+def build_hit_record(hit, fragment_size):
+    """
+    GraphQLに依存しない、Elasticsearchのhitだけから作れる部分を作る
+    """
 
+    record = dict()
     fragment = None
     if hasattr(hit.meta, 'highlight'):
         for field in [BillText.Field.REASON, BillText.Field.BODY, BillText.Field.SUPPLEMENT]:
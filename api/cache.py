@@ -0,0 +1,154 @@
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+
+LOGGER = logging.getLogger(__name__)
+CACHES = []  # every EntityCache and ResponseCache, exported by /metrics
+
+
+class LocalBackend:
+    """
+    プロセス内のTTL付きLRUキャッシュ
+    """
+
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expire_time, value)
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = dict()
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+                if item[0] <= now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = item[1]
+        return found
+
+    def set_many(self, mapping):
+        expire_time = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in mapping.items():
+                self._data[key] = (expire_time, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class EntityCache:
+    """
+    politylink idをkeyとしてGraphQLから取得した情報をキャッシュする。
+    backendはget_many/set_many/clear/__len__を持つものであれば差し替えられる(テスト用のスタブなど)。
+    """
+
+    def __init__(self, name, backend=None):
+        self.name = name
+        self.backend = backend if backend is not None else LocalBackend()
+        self.hits = 0
+        self.misses = 0
+        CACHES.append(self)
+
+    def get_or_fetch(self, ids, fetch_func):
+        """
+        キャッシュに無いidだけをfetch_funcで取得し、{id: info}を返す
+
+        :param ids: politylink idのリスト
+        :param fetch_func: idのリストを受け取り{id: info}を返す関数
+        """
+
+        unique_ids = list(dict.fromkeys(ids))
+        info_map = self.backend.get_many(unique_ids)
+        missed_ids = [id_ for id_ in unique_ids if id_ not in info_map]
+        self.hits += len(unique_ids) - len(missed_ids)
+        self.misses += len(missed_ids)
+        if missed_ids:
+            fetched = fetch_func(missed_ids)
+            self.backend.set_many(fetched)
+            info_map.update(fetched)
+        LOGGER.debug('%s cache: %s hits, %s misses', self.name, len(unique_ids) - len(missed_ids), len(missed_ids))
+        return info_map
+
+    def get_stats(self):
+        return {'name': self.name, 'hits': self.hits, 'misses': self.misses, 'size': len(self.backend)}
+
+    def clear(self):
+        self.backend.clear()
+
+
+class ResponseCache:
+    """
+    正規化したリクエストパラメータをkeyとして、シリアライズ済みのレスポンスをキャッシュする。
+    同じkeyのmissが同時に起きた場合は最初の1リクエストだけが計算し、残りはその結果を待つ(single-flight)。
+    """
+
+    def __init__(self, name, backend=None):
+        self.name = name
+        self.backend = backend if backend is not None else LocalBackend(max_size=1000, ttl=60)
+        self.hits = 0
+        self.misses = 0
+        self._flights = dict()  # key -> Future of the response being computed
+        self._lock = Lock()
+        CACHES.append(self)
+
+    def get_or_compute(self, key, compute_func):
+        found = self.backend.get_many([key])
+        if key in found:
+            self.hits += 1
+            return found[key]
+
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = Future()
+        if not is_leader:
+            self.hits += 1
+            return flight.result()
+
+        self.misses += 1
+        try:
+            value = compute_func()
+            self.backend.set_many({key: value})
+            flight.set_result(value)
+            return value
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def get_stats(self):
+        return {'name': self.name, 'hits': self.hits, 'misses': self.misses, 'size': len(self.backend)}
+
+    def clear(self):
+        self.backend.clear()
+
+
+def build_cache_key(kwargs):
+    """
+    リクエストパラメータのdictをキャッシュのkeyに変換する。リストは順序と重複を無視する。
+    """
+
+    items = []
+    for key, value in sorted(kwargs.items()):
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(set(value)))
+        items.append((key, value))
+    return tuple(items)
@@ -0,0 +1,53 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from elasticsearch import Elasticsearch
+from politylink.elasticsearch.client import ElasticsearchClient, ELASTICSEARCH_URL
+from politylink.graphql.client import GraphQLClient, POLITYLINK_AUTH
+from requests.adapters import HTTPAdapter
+from sgqlc.endpoint.requests import RequestsEndpoint
+
+LOGGER = logging.getLogger(__name__)
+GRAPHQL_URL = 'https://graphql.politylink.jp'
+POOL_SIZE = 32
+TIMEOUT = 30
+
+
+def build_es_client(url=ELASTICSEARCH_URL, pool_size=POOL_SIZE):
+    """
+    keep-aliveなコネクションをpool_sizeまで使い回すElasticsearchClientを作る
+    """
+
+    es_client = ElasticsearchClient(url)
+    es_client.client = Elasticsearch(url, maxsize=pool_size)
+    return es_client
+
+
+def build_gql_client(url=GRAPHQL_URL, pool_size=POOL_SIZE):
+    """
+    requests.Sessionでコネクションを使い回すGraphQLClientを作る
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    gql_client = GraphQLClient(url=url)
+    gql_client.endpoint = RequestsEndpoint(url, {'Authorization': POLITYLINK_AUTH}, timeout=TIMEOUT, session=session)
+    return gql_client
+
+
+es_client = build_es_client()
+gql_client = build_gql_client()
+# Elasticsearch and GraphQL requests that do not depend on each other are run concurrently on this pool
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='backend')
+
+
+def reconnect():
+    """
+    forkしたworkerが親プロセスのコネクションを共有しないよう、ElasticsearchとGraphQLのコネクションプールを作り直す
+    """
+
+    es_client.client = build_es_client().client
+    gql_client.endpoint = build_gql_client().endpoint
@@ -0,0 +1,56 @@
+from collections import namedtuple
+
+from elasticsearch_dsl import Q
+
+from api.utils import InvalidParameterError
+
+MAX_FACET_VALUES = 300  # enough for every diet number
+
+# field: Elasticsearch field to filter and aggregate, to_label: function to convert a value to its label (optional)
+Facet = namedtuple('Facet', ['field', 'to_label'])
+
+
+def apply_filters(s, name2facet, name2values, facets=()):
+    """
+    name2valuesのtermsフィルタをSearchに追加し、facetsに含まれるものはterms aggregationで値ごとの件数も集計する。
+    facetのフィルタはpost_filterにするので、各facetの件数には他のfacetのフィルタだけが適用される。
+
+    :param name2facet: facet名 -> Facet
+    :param name2values: facet名 -> フィルタする値のリスト
+    :param facets: 件数を集計するfacet名のリスト
+    """
+
+    for name in facets:
+        if name not in name2facet:
+            raise InvalidParameterError(f'unknown facet: {name}')
+    name2query = dict((name, Q('terms', **{name2facet[name].field: values}))
+                      for name, values in name2values.items() if values)
+
+    for name, query in name2query.items():
+        if name not in facets:
+            s = s.filter(query)
+    post_filters = [query for name, query in name2query.items() if name in facets]
+    if post_filters:
+        s = s.post_filter('bool', filter=post_filters)
+    for name in facets:
+        other_filters = [query for other_name, query in name2query.items() if other_name in facets and other_name != name]
+        s.aggs.bucket(name, 'filter', Q('bool', filter=other_filters) if other_filters else Q('match_all')) \
+            .bucket(name, 'terms', field=name2facet[name].field, size=MAX_FACET_VALUES)
+    return s
+
+
+def build_facets(es_response, name2facet, facets):
+    """
+    apply_filtersで追加したaggregationの結果を {facet名: [{'value', 'label', 'count'}]} に変換する
+    """
+
+    name2buckets = dict()
+    for name in facets:
+        to_label = name2facet[name].to_label
+        buckets = []
+        for bucket in es_response.aggregations[name][name].buckets:
+            buckets.append({'value': bucket.key, 'count': bucket.doc_count})
+            if to_label:
+                buckets[-1]['label'] = to_label(bucket.key)
+        name2buckets[name] = buckets
+    return name2buckets
@@ -0,0 +1,34 @@
+import orjson
+from flask import Response
+from flask_cors import cross_origin
+
+import api.wordcloud.tfidf as tfidf
+from api import app, metrics
+from api.cache import CACHES
+from api.suggest import suggester
+
+
+@app.route('/ready', methods=['GET'])
+@cross_origin()
+def ready_api():
+    """
+    起動時のデータ読み込みが完了していれば200、それ以外は503を返す
+    """
+
+    status = {
+        'ready': tfidf.is_ready() and suggester.is_ready(),
+        'reference': tfidf.reference is not None,
+        'termStats': tfidf.get_load_status(),
+        'suggest': suggester.is_ready()
+    }
+    return orjson.dumps(status), 200 if status['ready'] else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    """
+    リクエストとstageごとの処理時間、処理中のリクエスト数、キャッシュのヒット数などをPrometheusの形式で返す。
+    値はworkerプロセスごとに集計される。
+    """
+
+    return Response(metrics.render(CACHES), mimetype='text/plain; version=0.0.4')
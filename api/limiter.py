@@ -0,0 +1,112 @@
+import logging
+import os
+import time
+from threading import Condition
+
+from flask import g
+
+from api import metrics
+
+LOGGER = logging.getLogger(__name__)
+# route -> (max concurrent requests, max queued requests) in each worker process
+DEFAULT_LIMITS = {
+    '/tf_idf': (2, 8),
+    '/bills/export': (1, 2),
+    '/members/export': (1, 2),
+}
+QUEUE_TIMEOUT = float(os.environ.get('POLITYLINK_QUEUE_TIMEOUT_SEC', 5))
+
+
+class OverloadedError(Exception):
+    """
+    同時実行数の上限に達し、リクエストを処理できない
+    """
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class ConcurrencyLimiter:
+    """
+    同時に処理するリクエストをmax_concurrency件までに制限し、超えた分はmax_queue件まで待たせる。
+    キューが一杯の場合はすぐに429、timeout秒待っても処理を始められない場合は503を返すためにOverloadedErrorを投げる。
+    """
+
+    def __init__(self, route, max_concurrency, max_queue, timeout=QUEUE_TIMEOUT):
+        self.route = route
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.num_active = 0
+        self.num_waiting = 0
+        self._cond = Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.num_active < self.max_concurrency:
+                self.num_active += 1
+                return
+            if self.num_waiting >= self.max_queue:
+                metrics.SHED_REQUESTS.inc(self.route, 'queue_full')
+                raise OverloadedError(f'too many requests to {self.route}', 429)
+            self.num_waiting += 1
+            metrics.QUEUED_REQUESTS.inc(self.route)
+            try:
+                with metrics.stage('queue'):
+                    deadline = time.monotonic() + self.timeout
+                    while self.num_active >= self.max_concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            metrics.SHED_REQUESTS.inc(self.route, 'timeout')
+                            raise OverloadedError(f'{self.route} is overloaded', 503)
+                        self._cond.wait(remaining)
+                    self.num_active += 1
+            finally:
+                self.num_waiting -= 1
+                metrics.QUEUED_REQUESTS.dec(self.route)
+
+    def release(self):
+        with self._cond:
+            self.num_active -= 1
+            self._cond.notify()
+
+
+def parse_limits(limits_str):
+    """
+    '/tf_idf=2:8,/bills=16:64' 形式の文字列を {route: (max_concurrency, max_queue)} に変換する。
+    max_concurrencyが0のrouteは制限しない。
+    """
+
+    limits = dict()
+    for item in filter(None, (item.strip() for item in limits_str.split(','))):
+        route, values = item.split('=')
+        max_concurrency, max_queue = values.split(':')
+        limits[route] = (int(max_concurrency), int(max_queue))
+    return limits
+
+
+def build_limiters(limits):
+    return dict((route, ConcurrencyLimiter(route, max_concurrency, max_queue))
+                for route, (max_concurrency, max_queue) in limits.items() if max_concurrency > 0)
+
+
+def acquire():
+    """
+    リクエストのrouteに制限があれば、処理を始められるまで待つ
+    """
+
+    limiter = limiters.get(metrics.get_route())
+    if limiter is not None:
+        limiter.acquire()
+        g.limiter = limiter
+
+
+def release(state=None):
+    state = g if state is None else state
+    limiter = state.pop('limiter', None)
+    if limiter is not None:
+        limiter.release()
+
+
+limiters = build_limiters(dict(DEFAULT_LIMITS, **parse_limits(os.environ.get('POLITYLINK_ROUTE_LIMITS', ''))))
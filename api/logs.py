@@ -0,0 +1,154 @@
+import atexit
+import logging
+import os
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+
+import orjson
+from flask import request
+
+LOG_DIR = os.environ.get('POLITYLINK_LOG_DIR', './log')
+ACCESS_LOGGER = logging.getLogger('api.access')
+# route -> rate of requests written to the access log, other routes are always written
+DEFAULT_SAMPLE_RATES = {
+    '/suggest': 0.1,
+    '/metrics': 0,
+    '/ready': 0,
+}
+# requests slower than this or failed with 5xx are written regardless of the sample rate
+SLOW_REQUEST_SEC = float(os.environ.get('POLITYLINK_ACCESS_LOG_SLOW_SEC', 1))
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    LogRecordをformatせずにqueueに入れる。formatはlistenerのスレッドで行うので、ログに渡したargsは後から変更しない。
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    dictのmsgを1行のJSONに変換する
+    """
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'pid': record.process}
+        entry.update(record.msg)
+        return orjson.dumps(entry).decode()
+
+
+class AsyncLogger:
+    """
+    loggerにqueueへ入れるhandlerを追加し、ファイルへの書き込みとrotationをバックグラウンドのスレッドで行う。
+    forkした子プロセスはpidを付けた別のファイルに書き込む。
+    """
+
+    def __init__(self, logger, file_name, formatter):
+        self.logger = logger
+        self.file_name = file_name
+        self.formatter = formatter
+        self.handler = build_file_handler(file_name, formatter)
+        self.queue_handler = RecordQueueHandler(SimpleQueue())
+        self.listener = None
+        logger.addHandler(self.queue_handler)
+
+    def start(self):
+        self.listener = QueueListener(self.queue_handler.queue, self.handler)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart_after_fork(self):
+        # each process rotates its file on its own byte count, which would rename a shared file under the others.
+        # the parent's handler is left open since the parent may be writing to it at fork
+        self.handler = build_file_handler(to_pid_file_name(self.file_name, os.getpid()), self.formatter)
+        # the listener thread does not survive fork, and records left in the parent's queue are written by the parent
+        self.queue_handler.queue = SimpleQueue()
+        self.start()
+
+
+def build_file_handler(file_name, formatter):
+    handler = RotatingFileHandler(os.path.join(LOG_DIR, file_name), maxBytes=1000000, backupCount=3)
+    handler.setFormatter(formatter)
+    return handler
+
+
+def to_pid_file_name(file_name, pid):
+    """
+    'api.log' -> 'api.1234.log'
+    """
+
+    root, ext = os.path.splitext(file_name)
+    return f'{root}.{pid}{ext}'
+
+
+def setup(logger):
+    """
+    loggerのログをapi.log、アクセスログをJSONでaccess.logに非同期に書き込む
+    """
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    ACCESS_LOGGER.setLevel(logging.INFO)
+    ACCESS_LOGGER.propagate = False
+    async_loggers = [
+        AsyncLogger(logger, 'api.log', logging.Formatter('%(asctime)s [%(name)s] %(levelname)s: %(message)s')),
+        AsyncLogger(ACCESS_LOGGER, 'access.log', JsonFormatter())
+    ]
+    for async_logger in async_loggers:
+        async_logger.start()
+        atexit.register(async_logger.stop)
+        os.register_at_fork(after_in_child=async_logger.restart_after_fork)
+
+
+def parse_sample_rates(rates_str):
+    """
+    '/suggest=0.1,/bills=0.5' 形式の文字列を {route: sample rate} に変換する
+    """
+
+    rates = dict()
+    for item in filter(None, (item.strip() for item in rates_str.split(','))):
+        route, rate = item.split('=')
+        rates[route] = float(rate)
+    return rates
+
+
+def get_request_info():
+    return {
+        'method': request.method,
+        'path': request.path,
+        'query': request.query_string.decode(errors='replace')
+    }
+
+
+def log_access(duration, state, request_info):
+    """
+    リクエストの処理時間とstageごとの内訳をアクセスログに書く。routeごとのsample rateで間引く。
+
+    :param state: リクエストのg
+    :param request_info: get_request_info()の結果
+    """
+
+    route = state.get('route', 'unknown')
+    status = state.get('status', 500)
+    rate = sample_rates.get(route, 1)
+    if status < 500 and duration < SLOW_REQUEST_SEC and random.random() >= rate:
+        return
+    timings = dict()
+    for name, stage_duration in state.get('timings') or []:
+        timings[name] = timings.get(name, 0) + stage_duration
+    ACCESS_LOGGER.info(dict(request_info, **{
+        'route': route,
+        'status': status,
+        'duration': round(duration * 1000, 1),
+        'stages': dict((name, round(stage_duration * 1000, 1)) for name, stage_duration in timings.items()),
+        'sampleRate': rate
+    }))
+
+
+sample_rates = dict(DEFAULT_SAMPLE_RATES, **parse_sample_rates(os.environ.get('POLITYLINK_ACCESS_LOG_SAMPLING', '')))
@@ -1,24 +1,65 @@
+import os
+
 import orjson
 from flask import request
 from flask_cors import cross_origin
 
-from api import app
-from api.member.search import search_members
+from api import app, stream_response
+from api.cache import ResponseCache, build_cache_key
+from api.member.search import search_members, export_members, activity_index
+from api.metrics import stage
+
+response_cache = ResponseCache('members')
 
 
 @app.route('/members', methods=['GET'])
 @cross_origin()
 def get_members_api():
-    kwargs = {
-        # query param
-        'query': request.args.get('q'),
-        'groups': request.args.getlist('group', lambda x: int(x)),
-        'houses': request.args.getlist('house', lambda x: int(x)),
+    kwargs = parse_search_params(request.args)
+    app.logger.info('search members: %s', kwargs)
+    if kwargs['cursor'] is not None:
+        # the next cursor holds a point in time, which must not outlive its keep alive in the cache
+        return serialize(search_members(**kwargs))
+    return response_cache.get_or_compute(build_cache_key(kwargs), lambda: serialize(search_members(**kwargs)))
+
+
+@app.route('/members/export', methods=['GET'])
+@cross_origin()
+def export_members_api():
+    kwargs = parse_query_params(request.args)
+    kwargs['fragment_size'] = int(request.args.get('fragment', 100))
+    app.logger.info('export members: %s', kwargs)
+    records = export_members(**kwargs)
+    return stream_response((orjson.dumps(record) + b'\n' for record in records),
+                           mimetype='application/x-ndjson')
+
+
+def serialize(response):
+    with stage('serialize'):
+        return orjson.dumps(response)
+
+
+def parse_search_params(args):
+    kwargs = parse_query_params(args)
+    kwargs.update({
         # response param
-        'page': int(request.args.get('page', 1)),
-        'num_items': int(request.args.get('items', 3)),
-        'fragment_size': int(request.args.get('fragment', 100))
+        'page': int(args.get('page', 1)),
+        'num_items': int(args.get('items', 3)),
+        'fragment_size': int(args.get('fragment', 100)),
+        'cursor': args.get('cursor'),
+        'facets': args.getlist('facet')
+    })
+    return kwargs
+
+
+def parse_query_params(args):
+    return {
+        'query': args.get('q'),
+        'groups': args.getlist('group', lambda x: int(x)),
+        'houses': args.getlist('house', lambda x: int(x)),
     }
-    app.logger.info(f'search members: {kwargs}')
-    response = search_members(**kwargs)
-    return orjson.dumps(response)
+
+
+# build the latest activity index in the background, members are served with the GraphQL fallback until then
+if os.environ.get('POLITYLINK_INIT_ON_IMPORT', 'true') == 'true':
+    activity_index.start()
@@ -0,0 +1,151 @@
+import logging
+import os
+import time
+
+from sgqlc.operation import Operation
+
+from politylink.graphql.schema import Query, _MemberFilter, _ActivityFilter, Activity
+from politylink.utils import to_date_str
+
+from api.client import gql_client
+from api.refresher import PeriodicRefresher
+from api.utils import iter_batches
+
+LOGGER = logging.getLogger(__name__)
+# seconds between incremental updates of the index
+REFRESH_INTERVAL = int(os.environ.get('POLITYLINK_ACTIVITY_REFRESH_SEC', 600))
+# seconds between full rebuilds, which pick up activities added later than newer ones
+REBUILD_INTERVAL = int(os.environ.get('POLITYLINK_ACTIVITY_REBUILD_SEC', 86400))
+MEMBER_BATCH_SIZE = 100
+ACTIVITY_PAGE_SIZE = 1000
+
+
+class ActivityIndex(PeriodicRefresher):
+    """
+    議員ごとの最新のactivityを保持する。
+    rebuild_interval秒ごとに全議員の最新のactivityを1件ずつ取得し、その間は前回までに見た最新の日時以降のactivityだけを
+    取得して更新する。それより古い日時のactivityが後から追加された場合は、次の全件の取得で反映される。
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, rebuild_interval=REBUILD_INTERVAL):
+        super().__init__('latest activities', refresh_interval)
+        self.rebuild_interval = rebuild_interval
+        self._member2activity = None  # member id -> (datetime.formatted, activity info)
+        self._watermark = None  # datetime.formatted of the latest activity seen so far
+        self._built_at = None  # time.monotonic() of the last full rebuild
+
+    def __len__(self):
+        return len(self._member2activity or dict())
+
+    def is_ready(self):
+        return self._member2activity is not None
+
+    def get(self, member_id):
+        """
+        member_idの最新のactivityを返す。存在しない、または初回の更新が終わっていない場合はNoneを返す。
+        """
+
+        member2activity = self._member2activity
+        item = member2activity.get(member_id) if member2activity is not None else None
+        return item[1] if item else None
+
+    def refresh(self):
+        if self._member2activity is None or time.monotonic() - self._built_at >= self.rebuild_interval:
+            built_at = time.monotonic()
+            member_ids = [member.id for member in gql_client.get_all_members(fields=['id'])]
+            member2activity = dict()
+            for batch in iter_batches(member_ids, MEMBER_BATCH_SIZE):
+                member2activity.update(fetch_latest_activity_map(batch))
+            num_updates = len(member2activity)
+            self._built_at = built_at
+        else:
+            # update a copy so that readers never see a partially updated index
+            member2activity = dict(self._member2activity)
+            num_updates = 0
+            # activities at the watermark itself are fetched again, which is harmless since the update is idempotent
+            for activity in iter_activities_since(self._watermark):
+                item = member2activity.get(activity.member_id)
+                if item is None or item[0] <= activity.datetime.formatted:
+                    member2activity[activity.member_id] = to_item(activity)
+                    num_updates += 1
+        self._watermark = max((item[0] for item in member2activity.values()), default=self._watermark)
+        self._member2activity = member2activity
+        LOGGER.info('updated latest activities of %s members (watermark=%s)', num_updates, self._watermark)
+
+
+def select_latest_activity(members):
+    """
+    Memberのクエリに最新のactivityを1件だけ取得するフィールドを追加する
+    """
+
+    select_activity(members.activities(first=1, order_by=['datetime_desc']))
+
+
+def select_activity(activities):
+    activities.datetime()
+    bill = activities.bill()
+    bill.name()
+    minutes = activities.minutes()
+    minutes.name()
+
+
+def fetch_latest_activity_map(member_ids):
+    """
+    :return: {member id: (datetime.formatted, activity info)}
+    """
+
+    op = Operation(Query)
+    members = op.member(filter=_MemberFilter({'id_in': member_ids}))
+    members.id()
+    select_latest_activity(members)
+    res = gql_client.endpoint(op)
+    gql_client.validate_response_or_raise(res)
+    return dict((member.id, to_item(get_latest_activity(member.activities)))
+                for member in (op + res).member if member.activities)
+
+
+def iter_activities_since(since=None):
+    """
+    日時がsince以降のactivityを古い順に返す。同じ日時のactivityはidの順に返す。
+    """
+
+    offset = 0
+    while True:
+        op = Operation(Query)
+        filter_ = _ActivityFilter({'datetime_gte': {'formatted': since}}) if since else None
+        # offset paging needs a total order, activities of the same minutes share their datetime
+        activities = op.activity(filter=filter_, order_by=['datetime_asc', 'id_asc'], first=ACTIVITY_PAGE_SIZE,
+                                 offset=offset)
+        activities.member_id()
+        select_activity(activities)
+        res = gql_client.endpoint(op)
+        gql_client.validate_response_or_raise(res)
+        page = (op + res).activity
+        yield from page
+        if len(page) < ACTIVITY_PAGE_SIZE:
+            return
+        offset += ACTIVITY_PAGE_SIZE
+
+
+def get_latest_activity(activities):
+    # activities are fetched in descending order, but do not rely on the order of the response
+    return max(activities, key=lambda x: x.datetime.formatted)
+
+
+def to_item(activity: Activity):
+    return activity.datetime.formatted, build_activity_info(activity)
+
+
+def build_activity_info(activity: Activity):
+    activity_info = {
+        'date': to_date_str(activity.datetime)
+    }
+    if activity.bill:
+        activity_info['type'] = 'bill'
+        activity_info['message'] = '{}を提出しました'.format(activity.bill.name)
+    elif activity.minutes:
+        activity_info['type'] = 'minutes'
+        activity_info['message'] = '{}で発言しました'.format(activity.minutes.name)
+    else:
+        raise ValueError(f'unknown activity type: {activity}')
+    return activity_info
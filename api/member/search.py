@@ -1,23 +1,86 @@
 import logging
 
-import time
 from elasticsearch_dsl import Search
 from sgqlc.operation import Operation
 
-from politylink.elasticsearch.client import ElasticsearchClient
 from politylink.elasticsearch.schema import MemberText, ParliamentaryGroup, House
-from politylink.graphql.client import GraphQLClient
-from politylink.graphql.schema import Query, _MemberFilter, Activity
-from politylink.utils import to_date_str
+from politylink.graphql.schema import Query, _MemberFilter
+
+from api.cache import EntityCache
+from api.client import es_client, gql_client, executor
+from api.facet import Facet, apply_filters, build_facets
+from api.member.activity import ActivityIndex, select_latest_activity, get_latest_activity, build_activity_info
+from api.metrics import iter_stage, stage, submit
+from api.pagination import MAX_TOTAL_HITS, paginate, build_next_cursor
+from api.utils import iter_batches
 
 LOGGER = logging.getLogger(__name__)
-es_client = ElasticsearchClient()
-gql_client = GraphQLClient(url='https://graphql.politylink.jp')
+member_cache = EntityCache('member')
+activity_index = ActivityIndex()
 
 GQL_FIELDS = ['id', 'name', 'name_hira', 'group']
+EXPORT_BATCH_SIZE = 500
+# keys are the names of the query parameters
+FACETS = {
+    'group': Facet(MemberText.Field.GROUP.value, lambda x: ParliamentaryGroup.from_index(x).label),
+    'house': Facet(MemberText.Field.HOUSE.value, lambda x: House.from_index(x).label),
+}
+
+
+def search_members(query: str, groups=None, houses=None, page: int = 1, num_items: int = 3, fragment_size: int = 100,
+                   cursor: str = None, facets=()):
+    """
+    :param facets: 値ごとの件数を返すフィルタ(FACETSのkey)のリスト
+    """
+
+    s, sort_fields = build_search(query, groups, houses, fragment_size, facets)
+    s = paginate(s, MemberText.index, sort_fields, page, num_items, cursor)
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug('search: %s', s.to_dict())
+
+    with stage('elasticsearch'):
+        es_response = s.extra(track_total_hits=MAX_TOTAL_HITS).execute()
+
+    gql_future = submit(executor, 'graphql', member_cache.get_or_fetch, [hit.id for hit in es_response.hits],
+                        fetch_gql_member_info_map)
+    with stage('build'):
+        hit_records = [build_hit_record(hit, fragment_size) for hit in es_response.hits]
+    member_info_map = gql_future.result()
+
+    response = build_response(es_response.hits, hit_records, member_info_map, es_response.hits.total.value)
+    if facets:
+        response['facets'] = build_facets(es_response, FACETS, facets)
+    if cursor is not None:
+        response['nextCursor'] = build_next_cursor(es_response, num_items)
+    return response
+
+
+def export_members(query: str, groups=None, houses=None, fragment_size: int = 100,
+                   batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    条件に一致する全ての議員をscrollで取得し、batch_size件ごとにGraphQLで一括取得したレコードを順に返す
+    """
+
+    s, _ = build_search(query, groups, houses, fragment_size)
+    s = s.params(size=batch_size)
+    for hits in iter_stage('elasticsearch', iter_batches(s.scan(), batch_size)):
+        # bypass member_cache so that a full export does not evict the entries of popular members
+        gql_future = submit(executor, 'graphql', fetch_gql_member_info_map, [hit.id for hit in hits])
+        with stage('build'):
+            hit_records = [build_hit_record(hit, fragment_size) for hit in hits]
+        member_info_map = gql_future.result()
+        for hit, hit_record in zip(hits, hit_records):
+            if hit.id in member_info_map:
+                yield build_member_record(hit, member_info_map[hit.id], hit_record)
+            else:
+                LOGGER.warning('failed to fetch %s from GraphQL', hit.id)
+
+
+def build_search(query: str, groups=None, houses=None, fragment_size: int = 100, facets=()):
+    """
+    ページング前のSearchと、そのソート順を返す。facetsのaggregationも追加する。
+    """
 
-
-def search_members(query: str, groups=None, houses=None, page: int = 1, num_items: int = 3, fragment_size: int = 100):
     s = Search(using=es_client.client, index=MemberText.index)
     if query:
         fields = [MemberText.Field.NAME + '^100', MemberText.Field.NAME_HIRA + '^100',
@@ -27,51 +90,46 @@ def search_members(query: str, groups=None, houses=None, page: int = 1, num_item
                        boundary_chars='.,!? \t\n、。',
                        fragment_size=fragment_size, number_of_fragments=1,
                        pre_tags=['<b>'], post_tags=['</b>'])
+        sort_fields = ['_score']
     else:
-        s = s.sort('-' + MemberText.Field.LAST_UPDATED_DATE)
-
-    if groups:
-        s = s.filter('terms', group=groups)
-    if houses:
-        s = s.filter('terms', house=houses)
-
-    idx_from = (page - 1) * num_items
-    idx_to = page * num_items
-    s = s[idx_from: idx_to]
-    LOGGER.debug(s.to_dict())
-
-    start_time_ms = time.time() * 1000
-    es_response = s.execute()
-    end_time_ms = time.time() * 1000
-    LOGGER.debug(f'took {end_time_ms - start_time_ms} for elasticsearch')
-
-    start_time_ms = time.time() * 1000
-    member_info_map = fetch_gql_member_info_map([hit.id for hit in es_response.hits])
-    end_time_ms = time.time() * 1000
-    LOGGER.debug(f'took {end_time_ms - start_time_ms} for GraphQL')
+        sort_fields = ['-' + MemberText.Field.LAST_UPDATED_DATE]
+        s = s.sort(*sort_fields)
 
-    return build_response(es_response, member_info_map, fragment_size)
+    s = apply_filters(s, FACETS, {'group': groups, 'house': houses}, facets)
+    return s, sort_fields
 
 
-def build_response(es_response, member_info_map, fragment_size):
+def build_response(hits, hit_records, member_info_map, total):
     member_records = []
-    for hit in es_response.hits:
+    for hit, hit_record in zip(hits, hit_records):
         member_id = hit.id
         if member_id in member_info_map:
             member_info = member_info_map.get(member_id)
-            member_records.append(build_member_record(hit, member_info, fragment_size))
+            member_records.append(build_member_record(hit, member_info, hit_record))
         else:
-            LOGGER.warning(f'failed to fetch {member_id} from GraphQL')
+            LOGGER.warning('failed to fetch %s from GraphQL', member_id)
     return {
-        'totalMembers': es_response.hits.total.value,
+        'totalMembers': total,
         'members': member_records
     }
 
 
-def build_member_record(hit, member_info, fragment_size):
+def build_member_record(hit, member_info, hit_record):
     record = {'id': hit.id}
     record.update(member_info)
+    activity_info = activity_index.get(hit.id)
+    if activity_info:
+        record['activity'] = activity_info
+    record.update(hit_record)
+    return record
+
+
+def build_hit_record(hit, fragment_size):
+    """
+    GraphQLに依存しない、Elasticsearchのhitだけから作れる部分を作る
+    """
 
+    record = dict()
     fragment = None
     if hasattr(hit.meta, 'highlight'):
         for field in [MemberText.Field.DESCRIPTION]:
@@ -101,12 +159,10 @@ def fetch_gql_member_info_map(member_ids):
     for field in GQL_FIELDS:
         getattr(members, field)()
 
-    activities = members.activities()  # TODO: fetch only the latest activity once POL-344 is fixed
-    activities.datetime()
-    bill = activities.bill()
-    bill.name()
-    minutes = activities.minutes()
-    minutes.name()
+    # the latest activity comes from activity_index once it is built
+    with_activity = not activity_index.is_ready()
+    if with_activity:
+        select_latest_activity(members)
 
     res = gql_client.endpoint(op)
     members = (op + res).member
@@ -118,23 +174,8 @@ def fetch_gql_member_info_map(member_ids):
         }
         if member.group:
             member_info['group'] = ParliamentaryGroup.from_gql(member.group).label
-        if member.activities:
-            latest_activity = max(member.activities, key=lambda x: x.datetime.formatted)
-            member_info['activity'] = build_activity_info(latest_activity)
+        if with_activity and member.activities:
+            member_info['activity'] = build_activity_info(get_latest_activity(member.activities))
         member_info_map[member.id] = member_info
     return member_info_map
 
-
-def build_activity_info(activity: Activity):
-    activity_info = {
-        'date': to_date_str(activity.datetime)
-    }
-    if activity.bill:
-        activity_info['type'] = 'bill'
-        activity_info['message'] = '{}を提出しました'.format(activity.bill.name)
-    elif activity.minutes:
-        activity_info['type'] = 'minutes'
-        activity_info['message'] = '{}で発言しました'.format(activity.minutes.name)
-    else:
-        raise ValueError(f'unknown activity type: {activity}')
-    return activity_info
@@ -0,0 +1,228 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import g, has_request_context, request
+
+LOGGER = logging.getLogger(__name__)
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class Metric:
+    """
+    ラベルごとに値を保持するPrometheusのメトリクス。値はプロセスごとに集計される。
+    """
+
+    type_ = NotImplemented
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = dict()
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines += self.render_value(labels, value)
+        return lines
+
+    def render_value(self, labels, value):
+        return [f'{self.name}{format_labels(self.label_names, labels)} {value}']
+
+
+class Counter(Metric):
+    type_ = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type_ = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type_ = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def render_value(self, labels, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bucket, count in zip(list(self.buckets) + ['+Inf'], counts):
+            cumulative += count
+            bucket_labels = format_labels(self.label_names + ('le',), labels + (str(bucket),))
+            lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+        lines.append(f'{self.name}_sum{format_labels(self.label_names, labels)} {total}')
+        lines.append(f'{self.name}_count{format_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+def format_labels(label_names, labels):
+    if not label_names:
+        return ''
+    pairs = []
+    for name, value in zip(label_names, labels):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+REGISTRY = []
+REQUEST_DURATION = Histogram('api_request_duration_seconds', 'Time spent to handle a request', ('route',))
+STAGE_DURATION = Histogram('api_stage_duration_seconds', 'Time spent in each stage of a request', ('route', 'stage'))
+STAGE_ERRORS = Counter('api_stage_errors_total', 'Number of exceptions raised in each stage (e.g. backend errors)',
+                       ('route', 'stage'))
+IN_FLIGHT = Gauge('api_requests_in_flight', 'Number of requests being handled', ('route',))
+QUEUED_REQUESTS = Gauge('api_requests_queued', 'Number of requests waiting for the concurrency limit', ('route',))
+SHED_REQUESTS = Counter('api_requests_shed_total', 'Number of requests rejected by the concurrency limit',
+                        ('route', 'reason'))
+
+
+def get_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unknown'
+
+
+def get_timings():
+    """
+    Server-Timingヘッダ用に、リクエスト中に計測したstageの時間を保持するリストを返す
+    """
+
+    if not has_request_context():
+        return None
+    if 'timings' not in g:
+        g.timings = []
+    return g.timings
+
+
+@contextmanager
+def stage(name, route=None, timings=None):
+    """
+    ブロック内の処理時間をstageとして記録する。リクエストのスレッド以外で使う場合はrouteとtimingsを渡す。
+    """
+
+    route = route or get_route()
+    timings = timings if timings is not None else get_timings()
+    start_time = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(route, name)
+        raise
+    finally:
+        duration = time.perf_counter() - start_time
+        STAGE_DURATION.observe(duration, route, name)
+        if timings is not None:
+            timings.append((name, duration))
+
+
+def submit(executor, name, func, *args, **kwargs):
+    """
+    executor.submitと同じだが、funcの実行時間を呼び出し元のリクエストのstageとして記録する
+    """
+
+    route, timings = get_route(), get_timings()
+
+    def run():
+        with stage(name, route, timings):
+            return func(*args, **kwargs)
+
+    return executor.submit(run)
+
+
+def iter_stage(name, iterable):
+    """
+    iterableの要素を順に返し、要素の生成にかかった時間の合計を1つのstageとして記録する。streamのresponseで使う。
+    """
+
+    route, timings = get_route(), get_timings()
+    iterator = iter(iterable)
+    duration = 0
+    try:
+        while True:
+            start_time = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception:
+                STAGE_ERRORS.inc(route, name)
+                raise
+            finally:
+                duration += time.perf_counter() - start_time
+            yield item
+    finally:
+        STAGE_DURATION.observe(duration, route, name)
+        if timings is not None:
+            timings.append((name, duration))
+
+
+def start_request():
+    g.start_time = time.perf_counter()
+    g.route = get_route()
+    IN_FLIGHT.inc(g.route)
+
+
+def end_request(state=None):
+    """
+    リクエストの処理時間を記録して返す
+
+    :param state: リクエストのg。streamのresponseはリクエストのcontextの外で閉じられるので、その場合に渡す
+    """
+
+    state = g if state is None else state
+    start_time = state.pop('start_time', None)
+    if start_time is None:
+        return None
+    duration = time.perf_counter() - start_time
+    REQUEST_DURATION.observe(duration, state.route)
+    IN_FLIGHT.dec(state.route)
+    return duration
+
+
+def build_server_timing():
+    timings = g.get('timings') or []
+    return ', '.join(f'{name};dur={duration * 1000:.1f}' for name, duration in timings)
+
+
+def render(caches=()):
+    """
+    全てのメトリクスとキャッシュの統計をPrometheusのtext formatで返す
+    """
+
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for metric_name, key, type_ in [('api_cache_hits_total', 'hits', 'counter'),
+                                    ('api_cache_misses_total', 'misses', 'counter'),
+                                    ('api_cache_size', 'size', 'gauge')]:
+        lines += [f'# HELP {metric_name} Cache {key}', f'# TYPE {metric_name} {type_}']
+        for cache in caches:
+            stats = cache.get_stats()
+            lines.append(f'{metric_name}{format_labels(("cache",), (stats["name"],))} {stats[key]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,94 @@
+import base64
+import time
+from threading import Lock
+
+import orjson
+
+from api.client import es_client
+from api.utils import InvalidParameterError
+
+PIT_KEEP_ALIVE = '1m'
+# first pages share the point in time of their index for this many seconds, which must be shorter than the keep alive
+PIT_MAX_AGE = 30
+# totals are exact up to this number of hits, which is also the deepest page that from/size can reach
+MAX_TOTAL_HITS = 10000
+
+
+class PointInTimes:
+    """
+    indexごとにpoint in timeを1つ開き、PIT_MAX_AGE秒の間に始まったcursorで共有する。
+    古くなったものは閉じずに、最後に使われてからkeep_alive後に失効させる(続きのページを読んでいるcursorがあるため)。
+    """
+
+    def __init__(self, max_age=PIT_MAX_AGE):
+        self.max_age = max_age
+        self._index2pit = dict()  # index -> (pit id, opened time)
+        self._lock = Lock()
+
+    def get(self, index):
+        with self._lock:
+            pit = self._index2pit.get(index)
+            if pit is not None and time.monotonic() - pit[1] < self.max_age:
+                return pit[0]
+        pit_id = es_client.client.open_point_in_time(index=index, keep_alive=PIT_KEEP_ALIVE)['id']
+        with self._lock:
+            self._index2pit[index] = (pit_id, time.monotonic())
+        return pit_id
+
+    def clear(self):
+        with self._lock:
+            self._index2pit.clear()
+
+
+def paginate(s, index, sort_fields, page: int = 1, num_items: int = 3, cursor: str = None):
+    """
+    cursorがNoneの場合はfrom/sizeで、それ以外の場合はsearch_after + point in timeでページングする。
+    cursorに空文字列を渡すと先頭ページを返す。
+
+    :param s: ページング前のSearch
+    :param index: 検索対象のindex (point in timeの作成に使う)
+    :param sort_fields: cursorを使う場合のソート順 (tiebreakerは自動で追加される)
+    """
+
+    if cursor is None:
+        return s[(page - 1) * num_items: page * num_items]
+
+    position = decode_cursor(cursor) if cursor else dict()
+    s = s.extra(size=num_items)
+    if position.get('after'):
+        s = s.extra(search_after=position['after'])
+    # the implicit _shard_doc tiebreaker of point in time keeps the order stable
+    pit_id = position.get('pit') or point_in_times.get(index)
+    return s.index().sort(*sort_fields).extra(pit={'id': pit_id, 'keep_alive': PIT_KEEP_ALIVE})
+
+
+def build_next_cursor(es_response, num_items: int):
+    """
+    次のページのcursorを返す。最後のページの場合はNoneを返す。
+    """
+
+    hits = es_response.hits
+    if len(hits) < num_items:
+        return None
+    position = {'after': list(hits[-1].meta.sort)}
+    if 'pit_id' in es_response:
+        position['pit'] = es_response.pit_id
+    return encode_cursor(position)
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(orjson.dumps(position)).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        position = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise InvalidParameterError(f'invalid cursor: {cursor}') from e
+    if not isinstance(position, dict) or not isinstance(position.get('after', []), list) or \
+            not isinstance(position.get('pit', ''), str):
+        raise InvalidParameterError(f'invalid cursor: {cursor}')
+    return position
+
+
+point_in_times = PointInTimes()
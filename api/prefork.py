@@ -0,0 +1,63 @@
+import gc
+import logging
+
+import api.wordcloud.tfidf as tfidf
+from api.client import reconnect
+from api.member.search import activity_index
+from api.suggest import suggester
+from api.wordcloud import reloader
+
+LOGGER = logging.getLogger(__name__)
+
+
+def load_shared_data():
+    """
+    workerをforkする前のmaster processで、読み込み専用のデータを同期的に読み込む。
+    forkしたworkerはcopy-on-writeでデータを共有するので、worker数が増えてもメモリは増えない。
+    gunicornの起動時と、workerを入れ替える前(SIGHUP)に呼ぶ。/loadで依頼されたterm statsがあれば読み込み直す。
+    """
+
+    reloader.enable()
+    request = reloader.take_request()
+    if request is None:
+        tfidf.initialize(wait=True, warm_up=False)
+    else:
+        reload_term_stats(request)
+    reloader.write_status(dict(tfidf.get_load_status(), request=request['id'] if request else 0))
+    for index in [suggester, activity_index]:
+        try:
+            index.refresh()
+        except Exception:
+            LOGGER.exception('failed to build %s, workers will retry it', type(index).__name__)
+    # objects tracked by the GC are written to on every collection, which would copy their pages to each worker
+    if hasattr(gc, 'freeze'):
+        gc.unfreeze()  # release the term stats replaced by a reload
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    LOGGER.info('loaded shared data (ready=%s)', tfidf.is_ready())
+
+
+def reload_term_stats(request):
+    """
+    /loadで依頼されたterm statsを読み込む。失敗した場合は読み込み済みのものを使い続ける。
+    """
+
+    if tfidf.reference is None:
+        LOGGER.warning('reload of %s is skipped since minutes and diets are not loaded', request['file'])
+        return
+    # workers report this status until the new workers replace them
+    reloader.write_status(dict(tfidf.get_load_status(), state='loading', file=request['file'], request=request['id']))
+    tfidf.dataset_loader.reload(request['file'], tfidf.reference, wait=True)
+
+
+def init_worker():
+    """
+    fork後の各workerで、コネクションを作り直してバックグラウンドの更新を開始する
+    """
+
+    reconnect()
+    # retry in the worker if the master process failed to load the data
+    tfidf.initialize(warm_up=False)
+    suggester.start()
+    activity_index.start()
@@ -0,0 +1,55 @@
+import logging
+import time
+from threading import Event, Lock, Thread
+
+LOGGER = logging.getLogger(__name__)
+# seconds before retrying a failed refresh
+RETRY_INTERVAL = 60
+
+
+class PeriodicRefresher:
+    """
+    refresh()をバックグラウンドのスレッドでrefresh_interval秒ごとに呼び出す。失敗した場合はRETRY_INTERVAL秒後に再試行する。
+    サブクラスはrefresh()とis_ready()を実装する。
+    """
+
+    def __init__(self, name, refresh_interval):
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self._thread = None
+        self._lock = Lock()
+        self._loaded = Event()
+
+    def is_ready(self):
+        raise NotImplementedError
+
+    def refresh(self):
+        raise NotImplementedError
+
+    def start(self, wait=False):
+        """
+        定期的な更新を開始する。2回目以降の呼び出しでは何もしない。
+
+        :param wait: 初回の更新が終わるまで待つか
+        """
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if wait and not self.is_ready():
+            self._loaded.wait()
+
+    def _run(self):
+        # the first refresh may have been done before the worker was forked
+        interval = self.refresh_interval if self.is_ready() else 0
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+                interval = self.refresh_interval
+            except Exception:
+                LOGGER.exception('failed to refresh %s', self.name)
+                interval = RETRY_INTERVAL
+            # do not block start(wait=True) while the backend is down
+            self._loaded.set()
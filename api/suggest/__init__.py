@@ -0,0 +1,31 @@
+import os
+
+import orjson
+from flask import request
+from flask_cors import cross_origin
+
+from api import app
+from api.suggest.index import Suggester
+from api.wordcloud.dataset import NotReadyError
+
+suggester = Suggester()
+
+
+@app.route('/suggest', methods=['GET'])
+@cross_origin()
+def suggest_api():
+    """
+    法案名、法案番号、タグ、議員名、議員名の読みがqで始まる法案と議員を返す。
+    Elasticsearchから定期的に作り直すメモリ上のindexだけを使い、リクエストごとにbackendへは問い合わせない。
+    """
+
+    if not suggester.is_ready():
+        raise NotReadyError('suggest index is not built yet')
+    types = request.args.getlist('type') or ['bill', 'member']
+    response = suggester.suggest(request.args.get('q', ''), int(request.args.get('items', 5)), types)
+    return orjson.dumps(response)
+
+
+# build the index in the background so that the worker can start serving immediately
+if os.environ.get('POLITYLINK_INIT_ON_IMPORT', 'true') == 'true':
+    suggester.start()
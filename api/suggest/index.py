@@ -0,0 +1,159 @@
+import logging
+import os
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+from elasticsearch_dsl import Search
+
+from politylink.elasticsearch.schema import BillText, MemberText, ParliamentaryGroup, House
+from politylink.utils.bill import extract_bill_number_or_none
+
+from api.client import es_client
+from api.refresher import PeriodicRefresher
+
+LOGGER = logging.getLogger(__name__)
+# seconds between refreshes of the index
+REFRESH_INTERVAL = int(os.environ.get('POLITYLINK_SUGGEST_REFRESH_SEC', 3600))
+SCAN_BATCH_SIZE = 1000
+KATAKANA2HIRAGANA = str.maketrans(dict((chr(code), chr(code - 0x60)) for code in range(ord('ァ'), ord('ヶ') + 1)))
+
+
+def normalize(text):
+    """
+    全角/半角、大文字/小文字、カタカナ/ひらがなの違いを無視できるように正規化する
+    """
+
+    return unicodedata.normalize('NFKC', text).lower().translate(KATAKANA2HIRAGANA)
+
+
+class PrefixIndex:
+    """
+    entryごとの文字列を正規化してソートした配列で保持し、前方一致する文字列を持つentryを返す。
+    entriesは優先度の高い順に並べておき、結果もその順で返す。
+    """
+
+    def __init__(self, entries, entry_texts):
+        """
+        :param entries: 検索結果として返すレコードのリスト
+        :param entry_texts: entries[i]を検索できる文字列のリスト
+        """
+
+        pairs = sorted(set((normalize(text), rank) for rank, texts in enumerate(entry_texts)
+                           for text in texts if text))
+        self.entries = entries
+        self.keys = [key for key, _ in pairs]
+        self.ranks = np.array([rank for _, rank in pairs], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, prefix, num_items):
+        prefix = normalize(prefix)
+        if not prefix or num_items <= 0:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        ranks = self.ranks[lo:hi]
+        # an entry can match with several texts, so widen the partition until num_items entries are found
+        num_candidates = num_items
+        while True:
+            if num_candidates >= len(ranks):
+                top_ranks = sort_unique(ranks)
+                break
+            top_ranks = sort_unique(np.partition(ranks, num_candidates - 1)[:num_candidates])
+            if len(top_ranks) >= num_items:
+                break
+            num_candidates *= 4
+        return [self.entries[rank] for rank in top_ranks[:num_items].tolist()]
+
+
+class Suggester(PeriodicRefresher):
+    """
+    法案と議員のPrefixIndexをバックグラウンドで定期的に作り直し、参照の差し替えで公開する
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        super().__init__('suggest index', refresh_interval)
+        self.bill_index = None
+        self.member_index = None
+
+    def is_ready(self):
+        return self.bill_index is not None and self.member_index is not None
+
+    def suggest(self, query, num_items=5, types=('bill', 'member')):
+        """
+        :return: {'bills': [...], 'members': [...]} typesに含まれるものだけを返す
+        """
+
+        bill_index, member_index = self.bill_index, self.member_index
+        response = dict()
+        if 'bill' in types:
+            response['bills'] = bill_index.search(query, num_items)
+        if 'member' in types:
+            response['members'] = member_index.search(query, num_items)
+        return response
+
+    def refresh(self):
+        bill_index, member_index = build_bill_index(), build_member_index()
+        self.bill_index, self.member_index = bill_index, member_index
+        LOGGER.info('built suggest index of %s bills and %s members', len(bill_index), len(member_index))
+
+
+def sort_unique(array):
+    # np.unique is hash based since numpy 2.3, which is slower for small int arrays
+    array = np.sort(array)
+    return array[np.concatenate([[True], array[1:] != array[:-1]])] if len(array) else array
+
+
+def build_bill_index():
+    fields = [BillText.Field.ID, BillText.Field.TITLE, BillText.Field.BILL_NUMBER, BillText.Field.TAGS,
+              BillText.Field.LAST_UPDATED_DATE]
+    hits = scan(BillText.index, fields)
+    hits.sort(key=lambda x: str(x.get(BillText.Field.LAST_UPDATED_DATE.value, '')), reverse=True)
+
+    entries, entry_texts = [], []
+    for hit in hits:
+        bill_number = hit.get(BillText.Field.BILL_NUMBER.value)
+        bill_number_short = extract_bill_number_or_none(bill_number, short=True) if bill_number else None
+        tags = list(hit.get(BillText.Field.TAGS.value) or [])
+        entries.append({
+            'id': hit[BillText.Field.ID.value],
+            'name': hit.get(BillText.Field.TITLE.value),
+            'billNumberShort': bill_number_short,
+            'tags': tags
+        })
+        entry_texts.append([hit.get(BillText.Field.TITLE.value), bill_number, bill_number_short] + tags)
+    return PrefixIndex(entries, entry_texts)
+
+
+def build_member_index():
+    fields = [MemberText.Field.ID, MemberText.Field.NAME, MemberText.Field.NAME_HIRA, MemberText.Field.GROUP,
+              MemberText.Field.HOUSE, MemberText.Field.LAST_UPDATED_DATE]
+    hits = scan(MemberText.index, fields)
+    hits.sort(key=lambda x: str(x.get(MemberText.Field.LAST_UPDATED_DATE.value, '')), reverse=True)
+
+    entries, entry_texts = [], []
+    for hit in hits:
+        entry = {
+            'id': hit[MemberText.Field.ID.value],
+            'name': hit.get(MemberText.Field.NAME.value),
+            'nameHira': hit.get(MemberText.Field.NAME_HIRA.value)
+        }
+        if hit.get(MemberText.Field.GROUP.value) is not None:
+            entry['group'] = ParliamentaryGroup.from_index(hit[MemberText.Field.GROUP.value]).label
+        if hit.get(MemberText.Field.HOUSE.value) is not None:
+            entry['house'] = House.from_index(hit[MemberText.Field.HOUSE.value]).label
+        entries.append(entry)
+        entry_texts.append([entry['name'], entry['nameHira']])
+    return PrefixIndex(entries, entry_texts)
+
+
+def scan(index, fields):
+    """
+    indexの全ての文書のfieldsをdictのリストで返す
+    """
+
+    s = Search(using=es_client.client, index=index).source([field.value for field in fields]) \
+        .params(size=SCAN_BATCH_SIZE)
+    return [hit.to_dict() for hit in s.scan()]
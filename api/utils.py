@@ -0,0 +1,35 @@
+class InvalidParameterError(ValueError):
+    """
+    リクエストパラメータが不正。400を返す
+    """
+
+    pass
+
+
+def parse_int(params, key, default=None):
+    """
+    paramsのkeyの値を整数に変換する。値がない場合はdefaultを返し、整数でない場合はInvalidParameterErrorを投げる
+    """
+
+    value = params.get(key)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidParameterError(f'{key} must be an integer: {value}')
+
+
+def iter_batches(iterable, batch_size):
+    """
+    iterableをbatch_size件ずつのリストにまとめて返す
+    """
+
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,15 +1,25 @@
+import os
+
 import orjson
 from flask import request
 from flask_cors import cross_origin
 
-from api import app
+from api import app, stream_response
+from api.metrics import iter_stage, stage
+from api.utils import parse_int
+from api.wordcloud.dataset import NotReadyError
 from api.wordcloud.search import search_speech
-from api.wordcloud.tfidf import calc_tfidfs, load_minutes_to_term_stats
+from api.wordcloud.tfidf import calc_tfidfs, iter_tfidfs, load_minutes_to_term_stats, get_load_status, initialize
 
 
 @app.route('/tf_idf', methods=['POST'])
 @cross_origin()
 def tfidf_api():
+    """
+    "stream": true の場合はWindowごとの結果を計算が終わり次第NDJSONで返す。
+    Acceptにtext/event-streamを含む場合はserver-sent eventsで返す。
+    """
+
     kwargs = {
         # query target
         'start_date_str': request.json.get('start'),
@@ -17,32 +27,64 @@ def tfidf_api():
         'committee': request.json.get('committee'),
         'diet_number': request.json.get('diet'),
         # tfidf param
-        'interval': int(request.json.get('interval', 0)),
-        'num_items': int(request.json.get('items', 200)),
+        'interval': parse_int(request.json, 'interval', 0),
+        'num_items': parse_int(request.json, 'items', 200),
+        # windowing
+        'unit': request.json.get('unit', 'day'),
+        'align': request.json.get('align', 'calendar'),
+        'step': parse_int(request.json, 'step') or None,
     }
+    if request.json.get('stream', False):
+        tfidfs = iter_stage('term_stats', iter_tfidfs(**kwargs))
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            return stream_response((b'data: ' + orjson.dumps(tfidf) + b'\n\n' for tfidf in tfidfs),
+                                   mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+        return stream_response((orjson.dumps(tfidf) + b'\n' for tfidf in tfidfs),
+                               mimetype='application/x-ndjson')
     tfidfs = calc_tfidfs(**kwargs)
-    return orjson.dumps(tfidfs)
+    with stage('serialize'):
+        return orjson.dumps(tfidfs)
 
 
 @app.route('/search', methods=['POST'])
 @cross_origin()
 def search_api():
-    kwargs = {
+    snippets = search_speech(**parse_search_params(request.json))
+    with stage('serialize'):
+        return orjson.dumps(snippets)
+
+
+def parse_search_params(params):
+    return {
         # query target
-        'term': request.json.get('term'),
-        'start_date_str': request.json.get('start'),
-        'end_date_str': request.json.get('end'),
-        'committee': request.json.get('committee'),
+        'term': params.get('term'),
+        'start_date_str': params.get('start'),
+        'end_date_str': params.get('end'),
+        'committee': params.get('committee'),
         # response param
-        'num_items': int(request.json.get('items', 3)),
-        'fragment_size': int(request.json.get('fragment', 100))
+        'num_items': int(params.get('items', 3)),
+        'fragment_size': int(params.get('fragment', 100))
     }
-    snippets = search_speech(**kwargs)
-    return orjson.dumps(snippets)
 
 
 @app.route('/load', methods=['POST'])
 @cross_origin()
 def load_api():
-    success = load_minutes_to_term_stats(request.json.get('file'))
-    return orjson.dumps(success)
+    started = load_minutes_to_term_stats(request.json.get('file'), wait=request.json.get('wait', False))
+    return orjson.dumps(started)
+
+
+@app.route('/load', methods=['GET'])
+@cross_origin()
+def load_status_api():
+    return orjson.dumps(get_load_status())
+
+
+@app.errorhandler(NotReadyError)
+def handle_not_ready(e):
+    return orjson.dumps({'error': str(e)}), 503
+
+
+# load minutes, diets and term stats in the background so that the worker can start serving immediately
+if os.environ.get('POLITYLINK_INIT_ON_IMPORT', 'true') == 'true':
+    initialize()
@@ -0,0 +1,228 @@
+import logging
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock, Thread
+
+import numpy as np
+
+from api.wordcloud.minutes import MinutesIndex
+from api.wordcloud.window import get_all_windows, get_diet_range, is_closed
+from termstats import DailyTermStats, TermStats, compact_tfs, load_term_stats
+
+LOGGER = logging.getLogger(__name__)
+MAX_COMMITTEE_DAILY_TERM_STATS = 16
+# top items of closed diets are computed in advance for these intervals and up to this number of items
+PRECOMPUTED_INTERVALS = (0, 7)
+PRECOMPUTED_NUM_ITEMS = 200
+# committees computed on every reload, e.g. '予算委員会,本会議'. other committees are computed when requested
+PRECOMPUTED_COMMITTEES = [committee.strip() for committee in
+                          os.environ.get('POLITYLINK_PRECOMPUTED_COMMITTEES', '').split(',') if committee.strip()]
+# top items of at most this number of the other committees are kept, the least recently used ones are evicted
+MAX_CACHED_COMMITTEES = 16
+
+
+class NotReadyError(Exception):
+    """
+    起動直後などでデータの読み込みが完了していない
+    """
+
+    pass
+
+
+class Dataset:
+    """
+    /tf_idfの計算に使うデータのスナップショット。公開後は変更しない。
+    """
+
+    def __init__(self, term_stats: TermStats, minutes_index: MinutesIndex, version: int, fp: str):
+        self.term_stats = term_stats
+        self.minutes_index = minutes_index
+        self.version = version
+        self.fp = fp
+        self.loaded_at = datetime.now()
+        self.all_daily_term_stats = DailyTermStats.build(term_stats, *minutes_index.get_minutes())
+        self._committee2daily = OrderedDict()
+        # committee -> {(diet number, interval): [(start, end, top arrays)]}
+        self._committee2diet_top_arrays = OrderedDict()
+        self._precomputed_committees = set()
+        self._committee2fp = dict()
+        self._shared_dir = None
+        self._lock = Lock()
+
+    def get_daily_term_stats(self, committee=None):
+        """
+        committeeのminutesを日ごとに合算したDailyTermStatsを返す。委員会ごとのものは初回に構築してキャッシュする。
+        """
+
+        if committee is None:
+            return self.all_daily_term_stats
+        with self._lock:
+            daily_term_stats = self._committee2daily.get(committee)
+            if daily_term_stats is not None:
+                self._committee2daily.move_to_end(committee)
+                return daily_term_stats
+        daily_term_stats = DailyTermStats.build(self.term_stats, *self.minutes_index.get_minutes(committee))
+        with self._lock:
+            self._committee2daily[committee] = daily_term_stats
+            while len(self._committee2daily) > MAX_COMMITTEE_DAILY_TERM_STATS:
+                self._committee2daily.popitem(last=False)
+        return daily_term_stats
+
+    def get_shared_daily_term_stats(self, committee=None):
+        """
+        他のプロセスがmmapで開けるよう、committeeのDailyTermStatsのブロックをファイルに書き出す。
+        ファイルは計算中のプロセスがまだ開いていない可能性があるので、Datasetが破棄されるまで削除しない。
+
+        :return: (ファイルのパス, DailyTermStats)
+        """
+
+        daily_term_stats = self.get_daily_term_stats(committee)
+        with self._lock:
+            fp = self._committee2fp.get(committee)
+            if fp is not None:
+                return fp, daily_term_stats
+            if self._shared_dir is None:
+                self._shared_dir = tempfile.mkdtemp(prefix=f'politylink-tfidf-{self.version}-')
+                weakref.finalize(self, shutil.rmtree, self._shared_dir, ignore_errors=True)
+            fp = os.path.join(self._shared_dir, f'{len(self._committee2fp)}.bin')
+            daily_term_stats.blocks.save(fp)
+            self._committee2fp[committee] = fp
+        return fp, daily_term_stats
+
+    def get_diet_top_items(self, diet, committee, interval, num_items):
+        """
+        終了した国会の会期をintervalで区切ったwindowごとに、上位num_items件の(tf, tfidf)を返す。
+        事前に計算したものがあればそれを使い、無ければ計算して保持する。
+
+        :return: (start_date, end_date, tfs, tfidfs) を順に返すiterator
+        """
+
+        if not self.is_precomputable(diet, interval, num_items):
+            raise ValueError(f'top items of diet {diet.number} with interval {interval} are not precomputable')
+        key = (diet.number, interval)
+        with self._lock:
+            if committee in self._committee2diet_top_arrays:
+                self._committee2diet_top_arrays.move_to_end(committee)
+            window_arrays = self._committee2diet_top_arrays.get(committee, dict()).get(key)
+        if window_arrays is None:
+            window_arrays = self._calc_diet_top_arrays(diet, committee, interval)
+            with self._lock:
+                self._committee2diet_top_arrays.setdefault(committee, dict())[key] = window_arrays
+                self._committee2diet_top_arrays.move_to_end(committee)
+                cached_committees = [committee for committee in self._committee2diet_top_arrays
+                                     if committee is not None and committee not in self._precomputed_committees]
+                for evicted_committee in cached_committees[:-MAX_CACHED_COMMITTEES]:
+                    del self._committee2diet_top_arrays[evicted_committee]
+        return ((start_date, end_date) + self.term_stats.to_dicts(*[array[:num_items] for array in arrays])
+                for start_date, end_date, arrays in window_arrays)
+
+    def precompute(self, diets, committees=()):
+        """
+        終了した国会ごとに、全体とcommitteesのそれぞれについて上位の(tf, tfidf)を計算しておく
+        """
+
+        closed_diets = [diet for diet in diets if is_closed(diet)]
+        self._precomputed_committees.update(committees)
+        for committee in [None] + list(committees):
+            for diet in closed_diets:
+                for interval in PRECOMPUTED_INTERVALS:
+                    self.get_diet_top_items(diet, committee, interval, 0)
+        LOGGER.info('precomputed top items of %s diets for %s committees', len(closed_diets), len(committees))
+
+    def get_cached_committees(self):
+        return [committee for committee in self._committee2diet_top_arrays if committee is not None]
+
+    @staticmethod
+    def is_precomputable(diet, interval, num_items):
+        return interval in PRECOMPUTED_INTERVALS and num_items <= PRECOMPUTED_NUM_ITEMS and is_closed(diet)
+
+    def _calc_diet_top_arrays(self, diet, committee, interval):
+        daily_term_stats = self.get_daily_term_stats(committee)
+        window_arrays = []
+        for start_date, end_date in get_all_windows(*get_diet_range(diet), interval):
+            term_ids, tfs, tfidfs = daily_term_stats.top_arrays(start_date, end_date, PRECOMPUTED_NUM_ITEMS)
+            # keep the arrays compact since they live as long as the dataset
+            arrays = (term_ids.astype(np.int32), compact_tfs(tfs), tfidfs)
+            window_arrays.append((start_date, end_date, arrays))
+        return window_arrays
+
+    def validate(self):
+        """
+        公開前に最低限の整合性を確認する
+        """
+
+        ts = self.term_stats
+        if ts.num_rows == 0:
+            raise ValueError('term stats is empty')
+        if len(ts.indptr) != ts.num_rows + 1 or ts.indptr[0] != 0 or ts.indptr[-1] != len(ts.indices):
+            raise ValueError('term stats has inconsistent indptr')
+        if np.any(np.diff(ts.indptr) < 0):
+            raise ValueError('term stats indptr is not sorted')
+        if not len(ts.indices) == len(ts.tfs) == len(ts.tfidfs):
+            raise ValueError('term stats has inconsistent array lengths')
+        if len(ts.indices) and (ts.indices.min() < 0 or ts.indices.max() >= ts.num_terms):
+            raise ValueError('term stats has out of range term ids')
+        if not any(minutes_id in ts for minutes_id in self.minutes_index.ids):
+            raise ValueError('term stats does not contain any known minutes')
+
+
+class DatasetLoader:
+    """
+    Datasetをバックグラウンドで構築・検証し、参照の差し替えで公開する。
+    読み出し側はcurrentを一度だけ参照すれば、リロード中も一貫したスナップショットを使える。
+    """
+
+    def __init__(self):
+        self.current = None
+        self._version = 0
+        self._lock = Lock()
+        self._status = {'state': 'empty'}
+
+    def reload(self, fp, reference, wait=False):
+        """
+        fpからDatasetを読み込み、終了した国会の上位の(tf, tfidf)を計算してから公開する。既にリロード中の場合は何もしない。
+
+        :return: waitの場合は公開に成功したか、それ以外はリロードを開始したか
+        """
+
+        with self._lock:
+            if self._status['state'] == 'loading':
+                LOGGER.warning('reload of %s is skipped since %s is loading', fp, self._status['file'])
+                return False
+            self._version += 1
+            version = self._version
+            self._status = {'state': 'loading', 'file': fp, 'version': version,
+                            'startedAt': datetime.now().isoformat()}
+        if wait:
+            return self._load(fp, reference, version)
+        Thread(target=self._load, args=(fp, reference, version), daemon=True).start()
+        return True
+
+    def get_status(self):
+        status = dict(self._status)
+        dataset = self.current
+        if dataset:
+            status['current'] = {'file': dataset.fp, 'version': dataset.version,
+                                 'loadedAt': dataset.loaded_at.isoformat()}
+        return status
+
+    def _load(self, fp, reference, version):
+        try:
+            dataset = Dataset(load_term_stats(fp), reference.minutes_index, version, fp)
+            dataset.validate()
+            dataset.precompute(reference.all_diets, PRECOMPUTED_COMMITTEES)
+        except Exception as e:
+            LOGGER.exception('failed to load minutes term stats from %s', fp)
+            with self._lock:
+                self._status = dict(self._status, state='failed', error=str(e),
+                                    finishedAt=datetime.now().isoformat())
+            return False
+        with self._lock:
+            self.current = dataset
+            self._status = dict(self._status, state='loaded', finishedAt=datetime.now().isoformat())
+        LOGGER.info('loaded minutes term stats from %s (version=%s)', fp, version)
+        return True
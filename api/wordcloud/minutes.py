@@ -0,0 +1,67 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+
+class MinutesIndex:
+    """
+    start_date_timeでソートしたminutesの索引。
+    日付の範囲検索はbisectで、委員会の絞り込みは委員会ごとのposting listで行う。
+    """
+
+    def __init__(self, all_minutes, max_committees=256):
+        minutes_list = [minutes for minutes in all_minutes if minutes.ndl_min_id]
+        dates = [to_datetime_dt(minutes.start_date_time) for minutes in minutes_list]
+        order = sorted(range(len(minutes_list)), key=lambda i: dates[i])  # stable for the same date
+        self.dates = [dates[i] for i in order]
+        self.ids = [minutes_list[i].id for i in order]
+        self.names = [minutes_list[i].name for i in order]
+        self.max_committees = max_committees
+        self._committee2postings = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_minutes_ids(self, start_date: datetime, end_date: datetime, committee=None):
+        """
+        [start_date, end_date) に開催されたminutesのIDを日付順で返す
+        """
+
+        if committee is None:
+            return self.ids[bisect_left(self.dates, start_date): bisect_left(self.dates, end_date)]
+        positions, dates = self.get_postings(committee)
+        return [self.ids[i] for i in positions[bisect_left(dates, start_date): bisect_left(dates, end_date)]]
+
+    def get_minutes(self, committee=None):
+        """
+        committeeに該当するminutesの(ID, 日付)のリストを日付順で返す
+        """
+
+        if committee is None:
+            return self.ids, self.dates
+        positions, dates = self.get_postings(committee)
+        return [self.ids[i] for i in positions], dates
+
+    def get_postings(self, committee):
+        """
+        名前にcommitteeを含むminutesの(位置, 日付)のリストを返す。初回のみ全件を走査する。
+        """
+
+        with self._lock:
+            postings = self._committee2postings.get(committee)
+            if postings is not None:
+                self._committee2postings.move_to_end(committee)
+                return postings
+        positions = [i for i, name in enumerate(self.names) if committee in name]
+        postings = (positions, [self.dates[i] for i in positions])
+        with self._lock:
+            self._committee2postings[committee] = postings
+            while len(self._committee2postings) > self.max_committees:
+                self._committee2postings.popitem(last=False)
+        return postings
+
+
+def to_datetime_dt(dt):
+    return datetime(year=dt.year, month=dt.month, day=dt.day)
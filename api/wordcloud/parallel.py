@@ -0,0 +1,65 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from termstats import DailyTermStats
+from termstats.worker import calc_top_arrays, get_pid
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WindowPool:
+    """
+    windowごとのtop itemsの計算を複数のプロセスに分割する。
+    DailyTermStatsはファイルに書き出したものを各プロセスがmmapで開くので、データはプロセス間で共有される。
+    """
+
+    def __init__(self, num_workers=0):
+        self.num_workers = num_workers
+        self._executor = None
+        self._lock = Lock()
+
+    def is_enabled(self):
+        return self.num_workers >= 1
+
+    def iter_top_arrays(self, fp, daily_term_stats: DailyTermStats, windows, num_items):
+        """
+        DailyTermStats.top_arraysを各windowについて計算し、windowsと同じ順序で返す。
+        計算はすぐに開始し、先頭から順に計算が終わったものを返すiteratorを返す。
+
+        :param fp: daily_term_statsのブロックを書き出したファイル
+        """
+
+        num_chunks = min(self.num_workers, len(windows))
+        chunk_size = (len(windows) + num_chunks - 1) // num_chunks
+        futures = [self.get_executor().submit(calc_top_arrays, fp, daily_term_stats.first_day,
+                                              daily_term_stats.num_days, daily_term_stats.level_offsets,
+                                              windows[i: i + chunk_size], num_items)
+                   for i in range(0, len(windows), chunk_size)]
+        return (arrays for future in futures for arrays in future.result())
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # do not fork the multi-threaded server process. the spawned processes import only termstats
+                self._executor = ProcessPoolExecutor(max_workers=self.num_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                LOGGER.info('started %s processes for tf/tfidf windows', self.num_workers)
+            return self._executor
+
+    def warm_up(self):
+        """
+        初回のリクエストがプロセスの起動を待たないよう、全てのプロセスを起動しておく
+        """
+
+        executor = self.get_executor()
+        for future in [executor.submit(get_pid) for _ in range(self.num_workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from api.wordcloud.minutes import MinutesIndex
+
+LOGGER = logging.getLogger(__name__)
+DATE_FORMAT = '%Y-%m-%d'
+
+# same attribute names as the GraphQL objects so that snapshots and GraphQL responses are interchangeable
+Minutes = namedtuple('Minutes', ['id', 'ndl_min_id', 'name', 'start_date_time'])
+Diet = namedtuple('Diet', ['number', 'start_date', 'end_date'])
+
+
+class ReferenceData:
+    """
+    /tf_idfが参照するminutesとdietの一覧
+    """
+
+    def __init__(self, all_minutes, all_diets):
+        self.all_minutes = all_minutes
+        self.all_diets = all_diets
+        self.minutes_index = MinutesIndex(all_minutes)
+        self.number2diet = dict([(diet.number, diet) for diet in all_diets])
+
+    @classmethod
+    def fetch(cls, gql_client):
+        all_minutes = gql_client.get_all_minutes(fields=["id", "ndl_min_id", "name", "start_date_time"])
+        all_diets = gql_client.get_all_diets(fields=["number", "start_date", "end_date"])
+        return cls(all_minutes, all_diets)
+
+    @classmethod
+    def load(cls, fp):
+        with open(fp, 'r') as f:
+            snapshot = json.load(f)
+        all_minutes = [Minutes(id_, ndl_min_id, name, to_date(date_str))
+                       for id_, ndl_min_id, name, date_str in snapshot['minutes']]
+        all_diets = [Diet(number, to_date(start_date_str), to_date(end_date_str))
+                     for number, start_date_str, end_date_str in snapshot['diets']]
+        return cls(all_minutes, all_diets)
+
+    def save(self, fp):
+        snapshot = {
+            'minutes': [[m.id, m.ndl_min_id, m.name, to_date_str(m.start_date_time)] for m in self.all_minutes],
+            'diets': [[d.number, to_date_str(d.start_date), to_date_str(d.end_date)] for d in self.all_diets]
+        }
+        tmp_fp = fp + '.tmp'
+        with open(tmp_fp, 'w') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_fp, fp)  # never leave a half written snapshot behind
+
+
+def load_reference_data(gql_client, snapshot_fp=None, max_age=24 * 60 * 60):
+    """
+    スナップショットがmax_age秒以内に作られていればそれを使い、それ以外はGraphQLから取得してスナップショットを更新する。
+    GraphQLからの取得に失敗した場合は古いスナップショットにフォールバックする。
+    """
+
+    has_snapshot = snapshot_fp is not None and os.path.exists(snapshot_fp)
+    if has_snapshot and time.time() - os.path.getmtime(snapshot_fp) < max_age:
+        try:
+            reference = ReferenceData.load(snapshot_fp)
+            LOGGER.info('loaded %s minutes from %s', len(reference.all_minutes), snapshot_fp)
+            return reference
+        except Exception:
+            LOGGER.exception('failed to load reference snapshot from %s', snapshot_fp)
+
+    try:
+        reference = ReferenceData.fetch(gql_client)
+    except Exception:
+        if not has_snapshot:
+            raise
+        LOGGER.exception('failed to fetch reference data from GraphQL, falling back to %s', snapshot_fp)
+        return ReferenceData.load(snapshot_fp)
+    LOGGER.info('fetched %s minutes from GraphQL', len(reference.all_minutes))
+
+    if snapshot_fp is not None:
+        try:
+            reference.save(snapshot_fp)
+        except Exception:
+            LOGGER.exception('failed to save reference snapshot to %s', snapshot_fp)
+    return reference
+
+
+def to_date(date_str):
+    return datetime.strptime(date_str, DATE_FORMAT).date()
+
+
+def to_date_str(dt):
+    return '{:04d}-{:02d}-{:02d}'.format(dt.year, dt.month, dt.day)
@@ -0,0 +1,115 @@
+"""
+gunicornで動かす場合、/loadはterm statsの読み込みをmaster processに依頼する。
+masterは読み込んだ後にworkerを入れ替える(SIGHUP)ので、全てのworkerが同じデータをcopy-on-writeで共有する。
+依頼と読み込みの状態は、workerをforkする前にmasterが作ったディレクトリのファイルで受け渡す。
+"""
+
+import atexit
+import os
+import shutil
+import signal
+import tempfile
+import time
+from threading import get_ident
+
+import orjson
+
+POLL_INTERVAL = 0.5
+
+_state_dir = None
+_master_pid = None
+
+
+def enable():
+    """
+    master processでworkerをforkする前に呼ぶ。2回目以降の呼び出しでは何もしない。
+    """
+
+    global _state_dir, _master_pid
+    if _state_dir is None:
+        _state_dir = tempfile.mkdtemp(prefix='politylink-load-')
+        _master_pid = os.getpid()
+        atexit.register(_remove_state_dir)
+
+
+def is_worker():
+    """
+    enable()を呼んだmaster processからforkしたworkerで動いているか
+    """
+
+    return _master_pid is not None and os.getpid() != _master_pid
+
+
+def request_reload(fp):
+    """
+    masterにfpの読み込みを依頼する。既に依頼済みで未処理のものがあれば置き換える。
+
+    :return: 依頼のID。IDは後の依頼ほど大きい
+    """
+
+    request_id = time.time_ns()
+    write_json('request.json', {'id': request_id, 'file': fp})
+    os.kill(_master_pid, signal.SIGHUP)
+    return request_id
+
+
+def take_request():
+    """
+    masterで未処理の依頼を取り出す。依頼がなければNoneを返す。
+    """
+
+    # move the file first so that a request written in the meantime is kept for the next call
+    try:
+        os.replace(os.path.join(_state_dir, 'request.json'), os.path.join(_state_dir, 'taken.json'))
+    except FileNotFoundError:
+        return None
+    return read_json('taken.json')
+
+
+def write_status(status):
+    write_json('status.json', status)
+
+
+def read_status():
+    """
+    masterが最後に書き込んだ読み込みの状態を返す。まだ書き込まれていなければNoneを返す。
+    """
+
+    return read_json('status.json')
+
+
+def wait_for(request_id):
+    """
+    request_idの依頼、またはそれより後の依頼の読み込みが終わるまで待つ
+
+    :return: request_idの依頼のファイルが公開されたか
+    """
+
+    while True:
+        status = read_status() or dict()
+        if status.get('request', 0) >= request_id and status.get('state') != 'loading':
+            return status['request'] == request_id and status['state'] == 'loaded'
+        time.sleep(POLL_INTERVAL)
+
+
+def write_json(file_name, obj):
+    # readers never see a partially written file, and concurrent writers do not share the temporary file
+    fp = os.path.join(_state_dir, file_name)
+    tmp_fp = f'{fp}.{os.getpid()}-{get_ident()}.tmp'
+    with open(tmp_fp, 'wb') as f:
+        f.write(orjson.dumps(obj))
+    os.replace(tmp_fp, fp)
+
+
+def read_json(file_name):
+    try:
+        with open(os.path.join(_state_dir, file_name), 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _remove_state_dir():
+    # workers inherit the exit handler, but only the master removes the directory
+    if os.getpid() == _master_pid:
+        shutil.rmtree(_state_dir, ignore_errors=True)
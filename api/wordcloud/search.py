@@ -1,16 +1,30 @@
+import logging
+
 from elasticsearch_dsl import Search
-from politylink.elasticsearch.client import ElasticsearchClient
 from politylink.elasticsearch.schema import SpeechText
-from politylink.graphql.client import GraphQLClient
 from politylink.graphql.schema import _SpeechFilter, Query
 from sgqlc.operation import Operation
 
-es_client = ElasticsearchClient()
-gql_client = GraphQLClient()
+from api.cache import EntityCache
+from api.client import es_client, gql_client
+from api.metrics import stage
+
+LOGGER = logging.getLogger(__name__)
+speech_cache = EntityCache('speech')
 
 
 def search_speech(term: str, start_date_str: str, end_date_str: str, committee: str = None,
                   num_items: int = 3, fragment_size: int = 100):
+    s = build_search(term, start_date_str, end_date_str, committee, num_items, fragment_size)
+    with stage('elasticsearch'):
+        response = s.execute()
+    with stage('graphql'):
+        speech_info_map = speech_cache.get_or_fetch([hit.id for hit in response.hits], fetch_gql_speech_info_map)
+    return build_response(response.hits, speech_info_map)
+
+
+def build_search(term: str, start_date_str: str, end_date_str: str, committee: str = None,
+                 num_items: int = 3, fragment_size: int = 100):
     s = Search(using=es_client.client, index=SpeechText.index) \
         .filter('range', **{SpeechText.Field.DATE: {'gte': start_date_str, 'lt': end_date_str}}) \
         .query('multi_match', query=term, fields=[SpeechText.Field.BODY]) \
@@ -19,26 +33,33 @@ def search_speech(term: str, start_date_str: str, end_date_str: str, committee:
                    pre_tags=['<b>'], post_tags=['</b>'])
     if committee:
         s = s.query('match', title=committee)
-    s = s[:num_items]
-    response = s.execute()
+    return s[:num_items]
 
+
+def build_response(hits, speech_info_map):
     records = []
-    for hit in response.hits:
+    for hit in hits:
+        if hit.id not in speech_info_map:
+            LOGGER.warning('failed to fetch %s from GraphQL', hit.id)
+            continue
         record = {
             'speech_id': hit.id,
             'speaker': hit.speaker,
             'date': hit.date,
             'body': hit.meta.highlight.body[0]
         }
-        record.update(fetch_gql_speech(record['speech_id']))
+        record.update(speech_info_map[hit.id])
         records.append(record)
     return records
 
 
-# TODO: support batch request
-def fetch_gql_speech(speech_id):
+def fetch_gql_speech_info_map(speech_ids):
+    speech_info_map = dict()
+    if not speech_ids:
+        return speech_info_map
+
     op = Operation(Query)
-    speech = op.speech(filter=_SpeechFilter({'id': speech_id}))
+    speech = op.speech(filter=_SpeechFilter({'id_in': speech_ids}))
     speech.id()
     speech.order_in_minutes()
     minutes = speech.belonged_to_minutes()
@@ -50,7 +71,12 @@ def fetch_gql_speech(speech_id):
     member.name()
 
     res = gql_client.endpoint(op)
-    speech = (op + res).speech[0]
+    for speech in (op + res).speech:
+        speech_info_map[speech.id] = build_speech_info(speech)
+    return speech_info_map
+
+
+def build_speech_info(speech):
     minutes = speech.belonged_to_minutes
     member = speech.be_delivered_by_member
 
@@ -1,126 +1,222 @@
-import json
 import logging
-from collections import defaultdict
-from datetime import datetime, timedelta
+import os
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
 
 from politylink.graphql.client import GraphQLClient
 from politylink.graphql.schema import _Neo4jDateTimeInput
-from politylink.utils import filter_dict_by_value
+
+from api.metrics import stage
+from api.wordcloud.dataset import DatasetLoader, NotReadyError
+from api.wordcloud.parallel import WindowPool
+from api.wordcloud import reloader
+from api.wordcloud.reference import load_reference_data
+from api.wordcloud.window import get_all_windows, get_diet_range, is_overlapping, to_default_interval, validate
+from termstats import SlidingTermStats
 
 LOGGER = logging.getLogger(__name__)
 DATE_FORMAT = '%Y-%m-%d'
 # JSON_FP = '/home/ec2-user/politylink/politylink-tools/wordcloud/minutes/tfidf.json'
-JSON_FP = '/Users/musui/politylink/politylink-tools/wordcloud/minutes/tfidf.json'
+JSON_FP = os.environ.get('POLITYLINK_TFIDF_FP',
+                         '/Users/musui/politylink/politylink-tools/wordcloud/minutes/tfidf.json')
+# optional local copy of all minutes and diets so that restarts do not need to query GraphQL
+REFERENCE_SNAPSHOT_FP = os.environ.get('POLITYLINK_REFERENCE_SNAPSHOT_FP')
+# number of processes to compute windows in parallel (0 computes them in the request thread)
+NUM_WINDOW_WORKERS = int(os.environ.get('POLITYLINK_TFIDF_WORKERS', 0))
+MIN_PARALLEL_WINDOWS = 8
+# seconds to wait before retrying a failed initialization, doubled on every failure up to the max
+INIT_RETRY_INTERVAL = 10
+MAX_INIT_RETRY_INTERVAL = 600
 
 gql_client = GraphQLClient()
 
 
 def calc_tfidfs(start_date_str: str, end_date_str: str, interval: int = 0, num_items: int = 200, *,
-                committee=None, diet_number=None):
+                committee=None, diet_number=None, unit='day', align='calendar', step=None):
     """
     Windowごとにtfとtfidfを算出し、リストで返す。日付は半開区間で指定する。
 
     :param start_date_str: '2020-10-26'
     :param end_date_str: '2020-12-06'
-    :param interval: tf/tfidfを算出する日付のwindow幅
+    :param interval: tf/tfidfを算出するwindow幅(unitの数)
     :param num_items: tf/tfidfの最大要素数
     :param committee: 委員会
     :param diet_number: 国会回次
+    :param unit: 'day', 'week', 'month', 'diet'
+    :param align: 'calendar' または 'start'
+    :param step: windowの開始日の間隔(unitの数)。intervalより小さい場合は移動平均になる
+    """
+
+    with stage('term_stats'):
+        return list(iter_tfidfs(start_date_str, end_date_str, interval, num_items, committee=committee,
+                                diet_number=diet_number, unit=unit, align=align, step=step))
+
+
+def iter_tfidfs(start_date_str: str, end_date_str: str, interval: int = 0, num_items: int = 200, *,
+                committee=None, diet_number=None, unit='day', align='calendar', step=None):
+    """
+    calc_tfidfsと同じ結果を、Windowごとに計算が終わり次第返すiteratorを返す。
+    パラメータの検証はiteratorを返す前に行う。
     """
 
+    validate(interval, unit, align, step)
+    reference, dataset = get_reference(), get_dataset()
     if diet_number:
-        diet = number2diet[int(diet_number)]
-        start_date = to_datetime_dt(diet.start_date)
-        end_date = to_datetime_dt(diet.end_date) + timedelta(days=1)
+        diet = reference.number2diet[int(diet_number)]
+        default_interval = to_default_interval(interval, unit, align, step)
+        if default_interval is not None and dataset.is_precomputable(diet, default_interval, num_items):
+            return (build_window_response(*items) for items in
+                    dataset.get_diet_top_items(diet, committee, default_interval, num_items))
+        start_date, end_date = get_diet_range(diet)
     else:
         start_date = datetime.strptime(start_date_str, DATE_FORMAT)
         end_date = datetime.strptime(end_date_str, DATE_FORMAT)
-    LOGGER.debug(f'calc tfidfs for range({start_date}, {end_date}, {interval}), '
-                 f'committee={committee}, diet_number={diet_number}')
-    windows = get_all_windows(start_date, end_date, interval)
-    LOGGER.debug(f'get {len(windows)} windows')
+    LOGGER.debug('calc tfidfs for range(%s, %s, %s %s), align=%s, step=%s, committee=%s, diet_number=%s',
+                 start_date, end_date, interval, unit, align, step, committee, diet_number)
+    windows = get_all_windows(start_date, end_date, interval, unit, align, step, reference.all_diets)
+    LOGGER.debug('get %s windows', len(windows))
+
+    if is_overlapping(windows):
+        return iter_sliding_tfidfs(dataset.get_daily_term_stats(committee), windows, num_items)
+
+    if window_pool.is_enabled() and len(windows) >= MIN_PARALLEL_WINDOWS:
+        fp, daily_term_stats = dataset.get_shared_daily_term_stats(committee)
+        window_arrays = window_pool.iter_top_arrays(fp, daily_term_stats, windows, num_items)
+        return (build_window_response(start_date, end_date, *dataset.term_stats.to_dicts(*arrays))
+                for (start_date, end_date), arrays in zip(windows, window_arrays))
 
-    response = []
+    daily_term_stats = dataset.get_daily_term_stats(committee)
+    return (build_window_response(start_date, end_date, *daily_term_stats.top_items(start_date, end_date, num_items))
+            for start_date, end_date in windows)
+
+
+def iter_sliding_tfidfs(daily_term_stats, windows, num_items):
+    """
+    重なったwindowを、直前のwindowとの差分の日だけ加減算して順に計算する
+    """
+
+    sliding_term_stats = SlidingTermStats(daily_term_stats)
+    term_stats = daily_term_stats.blocks
     for start_date, end_date in windows:
-        minutes_ids = get_target_minutes_ids(start_date, end_date, committee)
-        LOGGER.debug(f'found {len(minutes_ids)} minutes for [{start_date}, {end_date})')
-        term_stats = merge_term_stats(minutes_ids)
-        tfidfs = {t: s[1] for t, s in term_stats.items()}
-        tfidfs = filter_dict_by_value(tfidfs, num_items)
-        tfs = {t: term_stats[t][0] for t in tfidfs.keys()}
-        response.append({
-            "start": start_date.strftime(DATE_FORMAT),
-            "end": end_date.strftime(DATE_FORMAT),
-            "tf": tfs,
-            "tfidf": tfidfs,
-        })
-    return response
-
-
-def get_all_windows(start_date: datetime, end_date: datetime, interval: int = 0):
-    windows = []
-    if interval == 0:
-        windows.append((start_date, end_date))
-    else:
-        window_start_date = start_date
-        # ToDo: handle interval != 7
-        window_end_date = start_date + timedelta(days=(interval - start_date.weekday()))
-        while window_end_date <= end_date:
-            windows.append((window_start_date, window_end_date))
-            window_start_date = window_end_date
-            window_end_date = window_start_date + timedelta(days=interval)
-        if window_start_date < end_date:
-            windows.append((window_start_date, end_date))
-    return windows
+        sliding_term_stats.move(start_date, end_date)
+        tfs, tfidfs = term_stats.to_dicts(*sliding_term_stats.top_arrays(num_items))
+        yield build_window_response(start_date, end_date, tfs, tfidfs)
+
+
+def build_window_response(start_date, end_date, tfs, tfidfs):
+    return {
+        "start": start_date.strftime(DATE_FORMAT),
+        "end": end_date.strftime(DATE_FORMAT),
+        "tf": tfs,
+        "tfidf": tfidfs,
+    }
 
 
 def get_target_minutes_ids(start_date, end_date, committee=None):
-    minutes_ids = []
-    for minutes in all_minutes:  # ToDo: use date->minutes map instead of full scan
-        minutes_date = to_datetime_dt(minutes.start_date_time)
-        if minutes.ndl_min_id and start_date <= minutes_date < end_date and \
-                (committee is None or committee in minutes.name):
-            minutes_ids.append(minutes.id)
-    return minutes_ids
-
-
-def merge_term_stats(minutes_ids):
-    merged = defaultdict(lambda: [0, 0])  # (tf, tfidf)
-    for id_ in minutes_ids:
-        if id_ in minutes2ts:
-            term_stats = minutes2ts[id_]
-            for term, stats in term_stats.items():
-                merged[term][0] += stats[0]
-                merged[term][1] += stats[1]
-    return merged
+    return get_reference().minutes_index.get_minutes_ids(start_date, end_date, committee)
 
 
 def to_neo4j_dt(dt):
     return _Neo4jDateTimeInput(year=dt.year, month=dt.month, day=dt.day)
 
 
-def to_datetime_dt(dt):
-    return datetime(year=dt.year, month=dt.month, day=dt.day)
+def load_minutes_to_term_stats(fp, wait=False):
+    """
+    term statsをJSON形式またはバイナリ形式(termstats.convertで変換したもの)のファイルから読み込む。
+    読み込みと検証はバックグラウンドで行い、完了後に参照を差し替える。
+    gunicornのworkerでは、master processが読み込んだ後に全てのworkerを入れ替える。
+
+    :return: waitの場合は読み込みに成功したか、それ以外は読み込みを開始したか
+    """
+
+    if reloader.is_worker():
+        # reloading only this worker would leave the others serving the old term stats
+        request_id = reloader.request_reload(fp)
+        return reloader.wait_for(request_id) if wait else True
+    return dataset_loader.reload(fp, get_reference(), wait=wait)
+
+
+def get_load_status():
+    if reloader.is_worker():
+        # the status of the master, which loads the term stats for every worker
+        status = reloader.read_status()
+        if status is not None:
+            status.pop('request')
+            return status
+    return dataset_loader.get_status()
+
+
+def get_reference():
+    if reference is None:
+        raise NotReadyError('minutes and diets are not loaded yet')
+    return reference
 
 
-def load_minutes_to_term_stats(json_fp):
-    global minutes2ts
-    try:
-        with open(json_fp, 'r') as f:
-            minutes2ts = json.load(f)
-    except Exception:
-        LOGGER.exception(f'failed to load minutes term stats from {json_fp}')
+def get_dataset():
+    dataset = dataset_loader.current  # keep using the same snapshot even if /load publishes a new one
+    if dataset is None:
+        raise NotReadyError('term stats are not loaded yet')
+    return dataset
+
+
+def initialize(wait=False, warm_up=True):
+    """
+    minutes, dietの一覧とterm statsの読み込みを開始する。読み込み中または読み込み済みの場合は何もしない。
+    失敗した場合は成功するまでバックグラウンドで再試行する。
+
+    :param wait: 最初の読み込みの試行が終わるまで待つか
+    :param warm_up: 読み込み後にwindow_poolのプロセスを起動するか。forkする前のプロセスでは起動しない
+    """
+
+    global init_thread
+    with init_lock:
+        # a thread started before fork is not alive in the forked process
+        if init_thread is None or (not init_thread.is_alive() and not is_ready()):
+            init_thread = Thread(target=_initialize, args=(warm_up,), daemon=True)
+            init_thread.start()
+    if wait:
+        init_attempted.wait()
+
+
+def _initialize(warm_up=True):
+    interval = INIT_RETRY_INTERVAL
+    while not _try_initialize(warm_up):
+        init_attempted.set()
+        LOGGER.warning('retrying to load minutes and term stats in %s seconds', interval)
+        time.sleep(interval)
+        interval = min(interval * 2, MAX_INIT_RETRY_INTERVAL)
+    init_attempted.set()
+
+
+def _try_initialize(warm_up):
+    global reference
+    if reference is None:
+        try:
+            reference = load_reference_data(gql_client, REFERENCE_SNAPSHOT_FP)
+        except Exception:
+            LOGGER.exception('failed to load minutes and diets')
+            return False
+    # a reload requested by /load in the meantime also counts
+    if dataset_loader.current is None and not dataset_loader.reload(JSON_FP, reference, wait=True):
         return False
-    LOGGER.info(f'loaded minutes term stats from {json_fp}')
+    if warm_up and window_pool.is_enabled():
+        window_pool.warm_up()
     return True
 
 
-all_minutes = gql_client.get_all_minutes(fields=["id", "ndl_min_id", "name", "start_date_time"])
-all_diets = gql_client.get_all_diets(fields=["number", "start_date", "end_date"])
-number2diet = dict([(diet.number, diet) for diet in all_diets])
-minutes2ts = None
-load_minutes_to_term_stats(JSON_FP)
+def is_ready():
+    return reference is not None and dataset_loader.current is not None
+
+
+reference = None
+dataset_loader = DatasetLoader()
+window_pool = WindowPool(NUM_WINDOW_WORKERS)
+init_lock = Lock()
+init_thread = None
+init_attempted = Event()
 
 # for debug
 if __name__ == '__main__':
+    initialize(wait=True)
     print(calc_tfidfs('2020-10-26', '2020-12-06', 7, num_items=5))
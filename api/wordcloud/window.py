@@ -0,0 +1,150 @@
+from calendar import monthrange
+from datetime import datetime, timedelta
+
+from api.utils import InvalidParameterError
+from api.wordcloud.minutes import to_datetime_dt
+
+UNITS = ['day', 'week', 'month', 'diet']
+ALIGNS = ['calendar', 'start']
+
+
+def get_all_windows(start_date: datetime, end_date: datetime, interval: int = 0, unit: str = 'day',
+                    align: str = 'calendar', step: int = None, diets=()):
+    """
+    [start_date, end_date) をwindowに分割する。windowはstart_dateとend_dateで切り詰める。
+
+    :param interval: windowの幅(unitの数)。0の場合は全体を1つのwindowとする
+    :param unit: 'day', 'week', 'month', または国会の会期ごとの 'diet'
+    :param align: 'calendar' の場合はwindowの境界を暦に揃える(週は月曜日、月は1日、N日は0001-01-01(月曜日)からN日ごと)。
+        'start' の場合はstart_dateから数える
+    :param step: windowの開始日の間隔(unitの数)。省略した場合はintervalと同じで、intervalより小さい場合はwindowが重なる
+    :param diets: unitが 'diet' の場合に使う国会のリスト
+    """
+
+    validate(interval, unit, align, step)
+    if interval == 0:
+        return [(start_date, end_date)]
+    if unit == 'diet':
+        return get_diet_windows(start_date, end_date, diets)
+    interval, unit, step = normalize(interval, unit, step)
+
+    if align == 'calendar':
+        to_index, from_index = (to_month_index, from_month_index) if unit == 'month' else (to_day_index, from_day_index)
+        anchor = to_day_index(datetime(1, 1, 1)) if unit == 'day' else 0
+        first = (to_index(start_date) - anchor) // step * step + anchor  # the last boundary at or before start_date
+
+        def get_window(i):
+            return from_index(first + i * step), from_index(first + i * step + interval)
+    else:
+        def get_window(i):
+            return shift(start_date, i * step, unit), shift(start_date, i * step + interval, unit)
+
+    windows = []
+    i = 0
+    window_start_date, window_end_date = get_window(i)
+    while window_start_date < end_date:
+        window = (max(window_start_date, start_date), min(window_end_date, end_date))
+        if window[0] < window[1]:
+            windows.append(window)
+        i += 1
+        window_start_date, window_end_date = get_window(i)
+    return windows
+
+
+def get_diet_windows(start_date: datetime, end_date: datetime, diets):
+    """
+    [start_date, end_date) と重なる国会の会期をwindowとして返す。会期外の日は含まない。
+    """
+
+    windows = []
+    for diet in sorted(diets, key=lambda x: to_datetime_dt(x.start_date)):
+        diet_start_date, diet_end_date = get_diet_range(diet)
+        if diet_start_date < end_date and diet_end_date > start_date:
+            windows.append((max(diet_start_date, start_date), min(diet_end_date, end_date)))
+    return windows
+
+
+def validate(interval: int, unit: str = 'day', align: str = 'calendar', step: int = None):
+    """
+    windowのパラメータが不正な場合はInvalidParameterErrorを投げる
+    """
+
+    if unit not in UNITS:
+        raise InvalidParameterError(f'unknown unit: {unit}')
+    if align not in ALIGNS:
+        raise InvalidParameterError(f'unknown align: {align}')
+    if interval < 0:
+        raise InvalidParameterError(f'interval must not be negative: {interval}')
+    if step is not None and step < 0:
+        raise InvalidParameterError(f'step must not be negative: {step}')
+
+
+def normalize(interval: int, unit: str, step: int = None):
+    """
+    週を7日に置き換え、stepを省略した場合はintervalとする
+
+    :return: (interval, unit, step)
+    """
+
+    step = step or interval
+    if unit == 'week':
+        return interval * 7, 'day', step * 7
+    return interval, unit, step
+
+
+def to_default_interval(interval: int, unit: str = 'day', align: str = 'calendar', step: int = None):
+    """
+    unit='day', align='calendar', step=intervalの場合と同じwindowになるならその日数を、それ以外はNoneを返す
+    """
+
+    validate(interval, unit, align, step)
+    if interval == 0:
+        return 0
+    if unit == 'diet' or align != 'calendar':
+        return None
+    interval, unit, step = normalize(interval, unit, step)
+    return interval if unit == 'day' and step == interval else None
+
+
+def is_overlapping(windows):
+    return any(prev_end_date > start_date for (_, prev_end_date), (start_date, _) in zip(windows, windows[1:]))
+
+
+def get_diet_range(diet):
+    """
+    国会の会期を半開区間 [start_date, end_date) で返す
+    """
+
+    return to_datetime_dt(diet.start_date), to_datetime_dt(diet.end_date) + timedelta(days=1)
+
+
+def is_closed(diet, today=None):
+    """
+    会期が終了しているか。終了した国会のtf/tfidfは変化しない。
+    """
+
+    today = today or datetime.now()
+    return get_diet_range(diet)[1] <= to_datetime_dt(today)
+
+
+def to_day_index(dt):
+    return dt.toordinal()
+
+
+def from_day_index(index):
+    return datetime.fromordinal(index)
+
+
+def to_month_index(dt):
+    return dt.year * 12 + dt.month - 1
+
+
+def from_month_index(index):
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def shift(dt, num_units, unit):
+    if unit == 'day':
+        return dt + timedelta(days=num_units)
+    year, month = divmod(to_month_index(dt) + num_units, 12)
+    return dt.replace(year=year, month=month + 1, day=min(dt.day, monthrange(year, month + 1)[1]))
@@ -0,0 +1,211 @@
+import re
+import time
+from threading import Lock
+
+ID_PATTERN = re.compile(r'"((?:Bill|Member|Speech):[^"]+)"')
+ROOT_PATTERN = re.compile(r'{\s*(\w+)')
+PAGE_PATTERN = re.compile(r'first: (\d+)\s+offset: (\d+)')
+
+
+class FakeElasticsearch:
+    """
+    Elasticsearchクライアントの代わりに、index毎に決まった件数の文書から固定のレスポンスを返す。
+    各リクエストはlatency秒待ってから応答する。
+    """
+
+    def __init__(self, latency=0.0, num_docs=None):
+        self.latency = latency
+        self.num_docs = dict({'bill': 1000, 'member': 700, 'speech': 10000}, **(num_docs or dict()))
+        self.num_requests = 0
+        self._lock = Lock()
+
+    def search(self, body=None, index=None, **params):
+        self._wait()
+        # the request body may be passed either as body or as keyword arguments
+        body = dict(body or dict(), **params)
+        if 'from_' in body:
+            body['from'] = body.pop('from_')
+        index = self._to_index(index, body)
+
+        if 'scroll' in body:
+            size = body.get('size', 10)
+            response = self._build_response(index, 0, size, body)
+            response['_scroll_id'] = self._encode_scroll_id(index, size, size)
+            return response
+
+        start = body.get('from', 0)
+        if body.get('search_after'):
+            start = body['search_after'][0] + 1
+        return self._build_response(index, start, body.get('size', 10), body)
+
+    def scroll(self, body=None, scroll_id=None, **params):
+        self._wait()
+        scroll_id = scroll_id or body['scroll_id']
+        index, start, size = scroll_id.split(':')
+        start, size = int(start), int(size)
+        response = self._build_response(index, start, size, dict())
+        response['_scroll_id'] = self._encode_scroll_id(index, start + size, size)
+        return response
+
+    def clear_scroll(self, body=None, scroll_id=None, **params):
+        return {'succeeded': True}
+
+    def count(self, body=None, index=None, **params):
+        self._wait()
+        return {'count': self.num_docs[self._to_index(index, dict())]}
+
+    def msearch(self, body=None, index=None, **params):
+        self._wait()
+        responses = []
+        for header, search_body in zip(body[::2], body[1::2]):
+            search_body = dict(search_body)
+            start = search_body.get('from', 0)
+            if search_body.get('search_after'):
+                start = search_body['search_after'][0] + 1
+            search_index = self._to_index(header.get('index') or index, search_body)
+            responses.append(self._build_response(search_index, start, search_body.get('size', 10), search_body))
+        return {'took': 1, 'responses': responses}
+
+    def open_point_in_time(self, index=None, keep_alive=None, **params):
+        self._wait()
+        return {'id': 'pit:' + self._to_index(index, dict())}
+
+    def _wait(self):
+        with self._lock:
+            self.num_requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _to_index(index, body):
+        if 'pit' in body:
+            return body['pit']['id'].split(':')[1]
+        if isinstance(index, (list, tuple)):
+            index = index[0]
+        return index.split(',')[0]
+
+    @staticmethod
+    def _encode_scroll_id(index, start, size):
+        return f'{index}:{start}:{size}'
+
+    def _build_response(self, index, start, size, body):
+        end = min(start + size, self.num_docs[index])
+        hits = [build_hit(index, i, 'highlight' in body) for i in range(start, end)]
+        response = {'took': 1, 'timed_out': False,
+                    '_shards': {'total': 1, 'successful': 1, 'skipped': 0, 'failed': 0},
+                    'hits': {'max_score': 1.0, 'hits': hits}}
+        track_total_hits = body.get('track_total_hits', 10000)
+        if track_total_hits is not False:
+            bound = self.num_docs[index] if track_total_hits is True else track_total_hits
+            response['hits']['total'] = {'value': min(self.num_docs[index], bound),
+                                         'relation': 'eq' if self.num_docs[index] <= bound else 'gte'}
+        if 'pit' in body:
+            response['pit_id'] = body['pit']['id']
+        if 'aggs' in body:
+            response['aggregations'] = self._build_aggregations(index, body['aggs'])
+        return response
+
+    def _build_aggregations(self, index, aggs):
+        """
+        terms aggregationを全文書について集計する。filter aggregationの条件は無視する。
+        """
+
+        results = dict()
+        for name, agg in aggs.items():
+            if 'filter' in agg:
+                results[name] = dict({'doc_count': self.num_docs[index]},
+                                     **self._build_aggregations(index, agg.get('aggs', dict())))
+            elif 'terms' in agg:
+                field = agg['terms']['field']
+                counts = dict()
+                for i in range(self.num_docs[index]):
+                    values = build_hit(index, i)['_source'].get(field, [])
+                    for value in (values if isinstance(values, list) else [values]):
+                        counts[value] = counts.get(value, 0) + 1
+                buckets = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:agg['terms'].get('size', 10)]
+                results[name] = {'doc_count_error_upper_bound': 0, 'sum_other_doc_count': 0,
+                                 'buckets': [{'key': key, 'doc_count': count} for key, count in buckets]}
+            else:
+                raise ValueError(f'unsupported aggregation: {agg}')
+        return results
+
+
+def build_hit(index, i, highlight=False):
+    if index == 'bill':
+        source = {'id': f'Bill:{i}', 'title': f'法律案{i}',
+                  'reason': '社会経済情勢の変化に対応するため、所要の措置を講ずる必要がある。これが、この法律案を提出する理由である。',
+                  'bill_number': f'第204回国会閣法第{i + 1}号', 'tags': ['行政'],
+                  'category': i % 3, 'status': i % 5, 'submitted_date': '2021-01-18', 'last_updated_date': '2021-03-31',
+                  'submitted_diet': 204, 'belonged_to_diets': [204, 205]}
+        highlight_field = 'reason'
+    elif index == 'member':
+        source = {'id': f'Member:{i}', 'name': f'議員{i}', 'name_hira': f'ぎいん{i}', 'group': i % 5, 'house': i % 2,
+                  'description': '衆議院議員。当選3回。内閣委員会、予算委員会に所属し、行政改革に取り組む。'}
+        highlight_field = 'description'
+    elif index == 'speech':
+        source = {'id': f'Speech:{i}', 'speaker': f'議員{i % 700}', 'date': '2021-02-01'}
+        highlight_field = 'body'
+    else:
+        raise ValueError(f'unknown index: {index}')
+    hit = {'_index': index, '_id': source['id'], '_score': 1.0, '_source': source, 'sort': [i, source['id']]}
+    if highlight or index == 'speech':
+        hit['highlight'] = {highlight_field: ['…について<b>検討</b>を進めてまいります。']}
+    return hit
+
+
+class FakeGraphQLEndpoint:
+    """
+    GraphQLClient.endpointの代わりに、クエリに含まれるidに対して固定の値を返す。
+    idを含まないMemberのクエリにはnum_members人の議員を、Activityのクエリにはactivitiesを返す(フィルタは無視する)。
+    各リクエストはlatency秒待ってから応答する。
+    """
+
+    def __init__(self, latency=0.0, num_members=700):
+        self.latency = latency
+        self.num_members = num_members
+        self.activities = []
+        self.num_requests = 0
+        self._lock = Lock()
+
+    def __call__(self, query, *args, **kwargs):
+        with self._lock:
+            self.num_requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        query = str(query)
+        ids = ID_PATTERN.findall(query)
+        root = ROOT_PATTERN.search(query).group(1)
+        if root == 'Activity':
+            first, offset = map(int, PAGE_PATTERN.search(query).groups())
+            return {'data': {'Activity': self.activities[offset: offset + first]}}
+        if not ids and root == 'Member':
+            ids = [f'Member:{i}' for i in range(self.num_members)]
+        if not ids:
+            return {'data': dict()}
+        class_ = ids[0].split(':')[0]
+        build_func = {'Bill': build_gql_bill, 'Member': build_gql_member, 'Speech': build_gql_speech}[class_]
+        return {'data': {class_: [build_func(id_) for id_ in ids]}}
+
+
+def build_gql_bill(bill_id):
+    return {'id': bill_id, 'name': f'法律案{bill_id}', 'billNumber': '第204回国会閣法第1号',
+            'category': 'KAKUHOU', 'tags': ['行政'], 'totalNews': 3, 'totalMinutes': 5,
+            'urls': [{'title': '本文PDF', 'url': 'https://example.com/1.pdf'},
+                     {'title': '概要PDF', 'url': 'https://example.com/2.pdf'}]}
+
+
+def build_gql_datetime(day):
+    return {'formatted': f'2021-03-{day:02d}T00:00:00', 'year': 2021, 'month': 3, 'day': day}
+
+
+def build_gql_member(member_id):
+    activities = [{'datetime': build_gql_datetime(day), 'bill': None, 'minutes': {'name': '予算委員会'}}
+                  for day in range(1, 11)]
+    return {'id': member_id, 'name': '議員', 'nameHira': 'ぎいん', 'group': 'JIMIN', 'activities': activities}
+
+
+def build_gql_speech(speech_id):
+    return {'id': speech_id, 'orderInMinutes': 10,
+            'belongedToMinutes': {'id': 'Minutes:1', 'name': '第204回国会 予算委員会 第1号',
+                                  'ndlMinId': '120405261X00120210125'},
+            'beDeliveredByMember': {'id': 'Member:1', 'name': '議員'}}
@@ -0,0 +1,211 @@
+"""
+ElasticsearchとGraphQLを固定のレスポンスを返すフェイクに置き換え、合成したminutesとterm statsで各APIのベンチマークを取る。
+
+    python -m benchmarks.run --output result.json
+    python -m benchmarks.run --scenario bills --scenario tf_idf_diet --es-latency 0.01 --gql-latency 0.05
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGGER = logging.getLogger(__name__)
+
+
+def build_scenarios(reference):
+    """
+    シナリオ名 -> (Flaskのtest clientでリクエストを送る関数, キャッシュを残すか) のdictを返す
+    """
+
+    diets = sorted(reference.all_diets, key=lambda x: x.number)
+    diet, committee = diets[len(diets) // 2], reference.all_minutes[0].name
+    start_date = diets[len(diets) // 3].start_date.isoformat()
+    end_date = diets[2 * len(diets) // 3].end_date.isoformat()
+
+    def get(url):
+        return lambda client: client.get(url)
+
+    def post(url, params):
+        return lambda client: client.post(url, json=params)
+
+    return {
+        'bills': (get('/bills?q=法律&items=10'), False),
+        'bills_cached': (get('/bills?q=法律&items=10'), True),
+        'bills_filter': (get('/bills?status=1&category=0&diet=204&items=10'), False),
+        'bills_cursor': (get('/bills?cursor=&items=10'), False),
+        'bills_export': (get('/bills/export'), False),
+        'members': (get('/members?q=議員&items=10'), False),
+        'members_export': (get('/members/export'), False),
+        'suggest': (get('/suggest?q=議員1&items=5'), False),
+        'search': (post('/search', {'term': '検討', 'start': start_date, 'end': end_date, 'items': 10}), False),
+        'batch': (post('/batch', {'queries': [
+            {'type': 'bills', 'params': {'q': '法律', 'items': 10}},
+            {'type': 'members', 'params': {'q': '議員', 'items': 10}},
+            {'type': 'search', 'params': {'term': '検討', 'start': start_date, 'end': end_date}}
+        ]}), False),
+        'tf_idf_range': (post('/tf_idf', {'start': start_date, 'end': end_date}), True),
+        'tf_idf_diet': (post('/tf_idf', {'diet': diet.number}), True),
+        'tf_idf_diet_weekly': (post('/tf_idf', {'diet': diet.number, 'interval': 7}), True),
+        'tf_idf_committee': (post('/tf_idf', {'diet': diet.number, 'committee': committee}), True),
+    }
+
+
+def run_scenario(client, request_func, keep_cache, iterations, warmup):
+    from api.cache import CACHES
+
+    def run_once():
+        if not keep_cache:
+            for cache in CACHES:
+                cache.clear()
+        # streamed responses release their concurrency slot when closed
+        with request_func(client) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f'unexpected status {response.status_code}: {response.data[:200]}')
+            return len(response.data)
+
+    for _ in range(warmup):
+        run_once()
+
+    latencies = []
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        iteration_start_time = time.perf_counter()
+        response_size = run_once()
+        latencies.append(time.perf_counter() - iteration_start_time)
+    elapsed = time.perf_counter() - start_time
+
+    # tracemalloc slows down allocations, so peak memory is measured in a separate run
+    tracemalloc.start()
+    run_once()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'iterations': iterations,
+        'throughput': iterations / elapsed,
+        'latencyMs': {
+            'mean': float(latencies_ms.mean()),
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p95': float(np.percentile(latencies_ms, 95)),
+            'p99': float(np.percentile(latencies_ms, 99)),
+            'max': float(latencies_ms.max())
+        },
+        'peakMemoryBytes': peak_memory,
+        'responseBytes': response_size
+    }
+
+
+def setup(args, work_dir):
+    """
+    合成データをファイルに書き出し、起動時と同じ経路で読み込ませたFlaskアプリを返す
+    """
+
+    # api reads these on import, so it must not be imported before this point
+    reference_fp = os.path.join(work_dir, 'reference.json')
+    term_stats_fp = os.path.join(work_dir, 'tfidf.bin')
+    os.environ['POLITYLINK_REFERENCE_SNAPSHOT_FP'] = reference_fp
+    os.environ['POLITYLINK_TFIDF_FP'] = term_stats_fp
+    os.environ['POLITYLINK_INIT_ON_IMPORT'] = 'false'
+    sys.path.insert(0, ROOT_DIR)
+    os.chdir(work_dir)  # api writes its log to ./log
+    from benchmarks.fakes import FakeElasticsearch, FakeGraphQLEndpoint
+    from benchmarks.synthetic import generate_reference, generate_term_stats
+
+    timings = dict()
+    start_time = time.perf_counter()
+    reference = generate_reference(args.num_minutes, args.num_committees, args.num_diets, seed=args.seed)
+    term_stats = generate_term_stats([minutes.id for minutes in reference.all_minutes],
+                                     args.num_terms, args.terms_per_minutes, seed=args.seed)
+    timings['generate'] = time.perf_counter() - start_time
+
+    reference.save(reference_fp)
+    term_stats.save(term_stats_fp)
+
+    from api import app
+    import api.client
+    import api.wordcloud.tfidf as tfidf
+    from api.member.search import activity_index
+    from api.suggest import suggester
+    start_time = time.perf_counter()
+    api.client.es_client.client = FakeElasticsearch(args.es_latency)
+    api.client.gql_client.endpoint = FakeGraphQLEndpoint(args.gql_latency)
+    tfidf.initialize(wait=True)
+    suggester.start(wait=True)
+    activity_index.start(wait=True)
+    if not tfidf.is_ready() or not suggester.is_ready() or not activity_index.is_ready():
+        raise RuntimeError('failed to load synthetic data')
+    timings['startup'] = time.perf_counter() - start_time
+    return app, reference, timings
+
+
+def get_git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='offline benchmark of politylink-api')
+    parser.add_argument('--scenario', action='append', help='scenario to run (default: all)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--es-latency', type=float, default=0.0, help='latency of each Elasticsearch request (sec)')
+    parser.add_argument('--gql-latency', type=float, default=0.0, help='latency of each GraphQL request (sec)')
+    parser.add_argument('--num-minutes', type=int, default=30000)
+    parser.add_argument('--num-committees', type=int, default=50)
+    parser.add_argument('--num-diets', type=int, default=60)
+    parser.add_argument('--num-terms', type=int, default=100000)
+    parser.add_argument('--terms-per-minutes', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to write the result (default: stdout)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+    LOGGER.setLevel(logging.INFO)
+
+    output_fp = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory(prefix='politylink-bench-') as work_dir:
+        app, reference, setup_timings = setup(args, work_dir)
+        scenarios = build_scenarios(reference)
+        names = args.scenario or list(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            parser.error(f'unknown scenarios: {sorted(unknown)}')
+
+        client = app.test_client()
+        results = dict()
+        for name in names:
+            LOGGER.info('running %s', name)
+            request_func, keep_cache = scenarios[name]
+            results[name] = run_scenario(client, request_func, keep_cache, args.iterations, args.warmup)
+
+    report = {
+        'revision': get_git_revision(),
+        'createdAt': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'config': vars(args),
+        'setupSec': setup_timings,
+        'scenarios': results
+    }
+    report_json = json.dumps(report, indent=2, ensure_ascii=False)
+    if output_fp:
+        with open(output_fp, 'w') as f:
+            f.write(report_json)
+    else:
+        print(report_json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from api.wordcloud.reference import Diet, Minutes, ReferenceData
+from termstats import TermStats
+
+FIRST_DATE = date(2000, 1, 1)
+
+
+def generate_reference(num_minutes=30000, num_committees=50, num_diets=60, seed=0):
+    """
+    num_diets回の国会と、その会期中に開かれたnum_minutes件の会議録を作る
+    """
+
+    rng = np.random.default_rng(seed)
+    diets, start_date = [], FIRST_DATE
+    for number in range(1, num_diets + 1):
+        end_date = start_date + timedelta(days=int(rng.integers(30, 150)))
+        diets.append(Diet(number, start_date, end_date))
+        start_date = end_date + timedelta(days=int(rng.integers(10, 90)))
+
+    committees = [f'委員会{i}' for i in range(num_committees)]
+    committee_weights = 1.0 / np.arange(1, num_committees + 1)  # a few committees hold most of the meetings
+    committee_ids = rng.choice(num_committees, size=num_minutes, p=committee_weights / committee_weights.sum())
+    diet_ids = rng.integers(0, num_diets, size=num_minutes)
+    all_minutes = []
+    for i, (committee_id, diet_id) in enumerate(zip(committee_ids, diet_ids)):
+        diet = diets[diet_id]
+        offset = int(rng.integers(0, (diet.end_date - diet.start_date).days + 1))
+        all_minutes.append(Minutes(f'Minutes:{i}', f'{i:021d}', committees[committee_id],
+                                   diet.start_date + timedelta(days=offset)))
+    return ReferenceData(all_minutes, diets)
+
+
+def generate_term_stats(minutes_ids, num_terms=100000, terms_per_minutes=200, seed=0):
+    """
+    各minutesにterms_per_minutes個前後のtermを割り当てたTermStatsを作る。termの出現頻度はZipf分布に従う。
+    """
+
+    rng = np.random.default_rng(seed)
+    num_rows = len(minutes_ids)
+    target_lengths = np.minimum(rng.poisson(terms_per_minutes, size=num_rows), num_terms)
+
+    # draw twice as many terms as needed from the Zipf distribution and drop duplicates in each row
+    cdf = np.cumsum(1.0 / np.arange(1, num_terms + 1))
+    num_draws = 2 * target_lengths + 10
+    draws = np.minimum(np.searchsorted(cdf, rng.random(num_draws.sum()) * cdf[-1]), num_terms - 1)
+    keys = np.sort(np.repeat(np.arange(num_rows, dtype=np.int64), num_draws) * num_terms + draws)
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    rows = keys // num_terms
+    row_starts = np.searchsorted(rows, np.arange(num_rows))
+    ranks = np.arange(len(keys)) - row_starts[rows]
+    keep = ranks < target_lengths[rows]
+    lengths = np.bincount(rows[keep], minlength=num_rows)
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(lengths)
+    indices = (keys[keep] % num_terms).astype(np.int32)
+
+    tfs = rng.zipf(2.0, size=len(indices)).astype(np.int64)
+    idfs = np.log(num_terms / (1.0 + np.arange(num_terms)))
+    tfidfs = tfs * idfs[indices] / lengths.max()
+    terms = [f'term{i}' for i in range(num_terms)]
+    return TermStats(terms, list(minutes_ids), indptr, indices, tfs, tfidfs)
@@ -0,0 +1,39 @@
+"""
+複数のworker processでAPIを動かす設定。
+
+    poetry run gunicorn -c gunicorn.conf.py api:app
+
+データはmaster processで読み込んでからworkerをforkするので、workerはcopy-on-writeでデータを共有する。
+/loadやSIGHUPではmasterがデータを読み込み直してから、workerを新しくforkしたものに入れ替える。
+"""
+
+import multiprocessing
+import os
+
+# the master process loads the data synchronously in on_starting instead of in the background on import
+os.environ.setdefault('POLITYLINK_INIT_ON_IMPORT', 'false')
+
+bind = os.environ.get('POLITYLINK_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('POLITYLINK_WORKERS', multiprocessing.cpu_count()))
+# threads handle the concurrent I/O bound requests to Elasticsearch and GraphQL
+worker_class = 'gthread'
+threads = int(os.environ.get('POLITYLINK_THREADS', 8))
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+
+
+def on_starting(server):
+    from api.prefork import load_shared_data
+    load_shared_data()
+
+
+def on_reload(server):
+    # called in the master process before the new workers are forked
+    from api.prefork import load_shared_data
+    load_shared_data()
+
+
+def post_fork(server, worker):
+    from api.prefork import init_worker
+    init_worker()
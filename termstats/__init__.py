@@ -0,0 +1,444 @@
+"""
+minutesごとの(tf, tfidf)の列指向の表現と、そのバイナリ形式。
+apiに依存しないので、変換のCLIやWindowPoolのプロセスはFlaskのappを作らずにimportできる。
+"""
+
+import json
+import logging
+import mmap
+import struct
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+MAGIC = b'PLTS'
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+
+class TermStats:
+    """
+    minutesごとの(tf, tfidf)をCSR形式で保持する。
+    termは整数IDにinternされ、i行目(= keys[i])のtermは indices[indptr[i]:indptr[i+1]] に格納される。
+    """
+
+    def __init__(self, terms, keys, indptr, indices, tfs, tfidfs):
+        self.terms = terms
+        self.keys = keys
+        self.indptr = indptr
+        self.indices = indices
+        self.tfs = tfs
+        self.tfidfs = tfidfs
+        self.key2row = dict((key, row) for row, key in enumerate(keys))
+
+    @property
+    def num_terms(self):
+        return len(self.terms)
+
+    @property
+    def num_rows(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.key2row
+
+    def __len__(self):
+        return self.num_rows
+
+    @classmethod
+    def from_dict(cls, key2ts):
+        """
+        {key: {term: [tf, tfidf]}} 形式のdictから構築する
+        """
+
+        terms, term2id = [], dict()
+        keys = []
+        indptr = [0]
+        indices, tfs, tfidfs = [], [], []
+        is_int_tf = True
+        for key, term_stats in key2ts.items():
+            keys.append(key)
+            for term, stats in term_stats.items():
+                term_id = term2id.get(term)
+                if term_id is None:
+                    term_id = term2id[term] = len(terms)
+                    terms.append(term)
+                indices.append(term_id)
+                tfs.append(stats[0])
+                tfidfs.append(stats[1])
+                is_int_tf = is_int_tf and isinstance(stats[0], int)
+            indptr.append(len(indices))
+        return cls(terms, keys,
+                   np.array(indptr, dtype=np.int64),
+                   np.array(indices, dtype=np.int32),
+                   np.array(tfs, dtype=np.int64 if is_int_tf else np.float64),
+                   np.array(tfidfs, dtype=np.float64))
+
+    @classmethod
+    def load(cls, fp):
+        """
+        save()で書き出したバイナリをmmapで開く。配列はページキャッシュ経由でプロセス間で共有される。
+        """
+
+        with open(fp, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = struct.unpack_from('<4sIQ', buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{fp} is not a term stats file')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'unsupported term stats format version: {version}')
+        header = json.loads(bytes(buffer[16: 16 + header_size]))
+        arrays = dict()
+        for name, (dtype, offset, count) in header.items():
+            arrays[name] = np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=offset)
+        keys = StringTable(arrays['key_offsets'], arrays['key_blob'])
+        return cls(StringTable(arrays['term_offsets'], arrays['term_blob']), list(keys),
+                   arrays['indptr'], arrays['indices'], arrays['tfs'], arrays['tfidfs'])
+
+    def save(self, fp):
+        """
+        term辞書、offset、(tf, tfidf)の配列を1つのバイナリファイルに書き出す
+        """
+
+        term_offsets, term_blob = StringTable.encode(self.terms)
+        key_offsets, key_blob = StringTable.encode(str(key) for key in self.keys)
+        arrays = [('term_offsets', term_offsets), ('term_blob', term_blob),
+                  ('key_offsets', key_offsets), ('key_blob', key_blob),
+                  ('indptr', np.asarray(self.indptr, dtype=np.int64)),
+                  ('indices', np.asarray(self.indices, dtype=np.int32)),
+                  ('tfs', compact_tfs(np.asarray(self.tfs))),
+                  ('tfidfs', np.asarray(self.tfidfs, dtype=np.float64))]
+
+        # the header size depends on the offsets, so fix its size with placeholder offsets first
+        def build_header(offsets):
+            return json.dumps(dict((name, [array.dtype.str, offset, len(array)])
+                                   for (name, array), offset in zip(arrays, offsets))).encode()
+
+        header_size = len(build_header([0] * len(arrays))) + 32 * len(arrays)
+        offsets, offset = [], align(16 + header_size)
+        for _, array in arrays:
+            offsets.append(offset)
+            offset = align(offset + array.nbytes)
+        header = build_header(offsets).ljust(header_size)
+
+        with open(fp, 'wb') as f:
+            f.write(struct.pack('<4sIQ', MAGIC, FORMAT_VERSION, header_size))
+            f.write(header)
+            for (_, array), offset in zip(arrays, offsets):
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(array.tobytes())
+        LOGGER.info('saved %s rows and %s terms to %s', self.num_rows, self.num_terms, fp)
+
+    def to_rows(self, keys):
+        """
+        keyのリストを行番号の配列に変換する。存在しないkeyは無視する。
+        """
+
+        rows = [self.key2row[key] for key in keys if key in self.key2row]
+        return np.array(rows, dtype=np.int64)
+
+    def gather(self, rows):
+        """
+        指定した行のエントリを行の順に連結して返す
+        """
+
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, self.tfs[empty], self.tfidfs[empty]
+        # positions = starts[i] + (0, 1, ..., lengths[i] - 1) for each row i
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(total)
+        return self.indices[positions], self.tfs[positions], self.tfidfs[positions]
+
+    def merge(self, rows):
+        """
+        指定した行の(tf, tfidf)をterm毎に合算する。
+
+        :return: (term_ids, tfs, tfidfs) term_idsは昇順
+        """
+
+        indices, tfs, tfidfs = self.gather(rows)
+        return self._merge(indices, tfs, tfidfs)
+
+    def top_items(self, rows, num_items):
+        """
+        指定した行を合算し、tfidfの上位num_items件を(tf, tfidf)のdictで返す。
+        同値の場合はterm ID(term statsで先に出現したterm)の順とする。
+        tfidfは行の順序に合算するので、行の順序や合算の単位(日、ブロック)が異なると最後の数bitが異なることがある。
+        """
+
+        return self.to_dicts(*self.top_arrays(rows, num_items))
+
+    def top_arrays(self, rows, num_items):
+        """
+        top_itemsと同じ上位num_items件を(term_ids, tfs, tfidfs)の配列でtfidfの降順に返す。
+        順序はnum_itemsに依らないので、上位k件は上位num_items件の先頭k件と一致する。
+        """
+
+        term_ids, merged_tfs, merged_tfidfs = self.merge(rows)
+        top = self._select_top(term_ids, merged_tfidfs, num_items)
+        return term_ids[top], merged_tfs[top], merged_tfidfs[top]
+
+    def to_dicts(self, term_ids, tfs, tfidfs):
+        terms = [self.terms[i] for i in term_ids.tolist()]
+        return dict(zip(terms, tfs.tolist())), dict(zip(terms, tfidfs.tolist()))
+
+    def _merge(self, indices, tfs, tfidfs):
+        # bincount accumulates weights in input order, so the sums depend on the order of the rows in the last bits
+        counts = np.bincount(indices, minlength=self.num_terms)
+        term_ids = np.flatnonzero(counts)
+        merged_tfidfs = np.bincount(indices, weights=tfidfs, minlength=self.num_terms)[term_ids]
+        merged_tfs = np.bincount(indices, weights=tfs, minlength=self.num_terms)[term_ids]
+        if self.tfs.dtype.kind == 'i':
+            merged_tfs = merged_tfs.astype(np.int64)
+        return term_ids, merged_tfs, merged_tfidfs
+
+    @staticmethod
+    def _select_top(term_ids, merged_tfidfs, num_items):
+        """
+        merged_tfidfsの上位num_items件の位置を降順で返す。同値の場合はterm IDの順とする。
+        """
+
+        num_items = min(len(term_ids), num_items)
+        if num_items <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if num_items < len(term_ids):
+            kth = np.argpartition(-merged_tfidfs, num_items - 1)[num_items - 1]
+            # keep all ties of the k-th value so that the tie-break below is exact
+            candidates = np.flatnonzero(merged_tfidfs >= merged_tfidfs[kth])
+        else:
+            candidates = np.arange(len(term_ids))
+        order = np.lexsort((term_ids[candidates], -merged_tfidfs[candidates]))
+        return candidates[order[:num_items]]
+
+    def aggregate(self, rows, groups, num_groups):
+        """
+        rows[i]の行をgroups[i]番目のグループに合算し、グループを行とするTermStatsを返す
+        """
+
+        indices, tfs, tfidfs = self.gather(rows)
+        lengths = self.indptr[rows + 1] - self.indptr[rows]
+        keys = np.repeat(np.asarray(groups, dtype=np.int64), lengths) * self.num_terms + indices
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)  # numpy>=2 keeps the input shape
+        merged_tfs = np.bincount(inverse, weights=tfs, minlength=len(unique_keys))
+        merged_tfidfs = np.bincount(inverse, weights=tfidfs, minlength=len(unique_keys))
+        if self.tfs.dtype.kind == 'i':
+            merged_tfs = merged_tfs.astype(np.int64)
+        indptr = np.searchsorted(unique_keys // self.num_terms, np.arange(num_groups + 1)).astype(np.int64)
+        return TermStats(self.terms, list(range(num_groups)), indptr,
+                         (unique_keys % self.num_terms).astype(np.int32), merged_tfs, merged_tfidfs)
+
+
+class StringTable:
+    """
+    utf-8で連結した文字列とそのoffsetを保持し、参照された要素だけをdecodeする
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]: self.offsets[i + 1]].tobytes().decode()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @staticmethod
+    def encode(strings):
+        encoded = [string.encode() for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def load_term_stats(fp):
+    """
+    バイナリ形式(TermStats.save)またはJSON形式のterm statsを読み込む
+    """
+
+    with open(fp, 'rb') as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    if is_binary:
+        return TermStats.load(fp)
+    with open(fp, 'r') as f:
+        return TermStats.from_dict(json.load(f))
+
+
+def compact_tfs(tfs):
+    if tfs.dtype.kind == 'i' and (len(tfs) == 0 or tfs.max() <= np.iinfo(np.int32).max):
+        return tfs.astype(np.int32)
+    return tfs
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class DailyTermStats:
+    """
+    日ごとに合算したterm statsを、2^level日のブロック単位でも事前に合算して保持する。
+    任意の[start_date, end_date)はO(log 日数)個のブロックの合算で求まる。
+    """
+
+    def __init__(self, blocks: TermStats, first_day: int, num_days: int, level_offsets):
+        self.blocks = blocks
+        self.first_day = first_day
+        self.num_days = num_days
+        self.level_offsets = level_offsets  # level_offsets[l] = row of the first block in level l
+
+    @property
+    def max_level(self):
+        return len(self.level_offsets) - 1
+
+    @classmethod
+    def build(cls, term_stats: TermStats, minutes_ids, dates, max_level=10):
+        """
+        :param term_stats: minutesごとのTermStats
+        :param minutes_ids: 対象とするminutesのID
+        :param dates: minutes_idsに対応する開催日(datetime)
+        :param max_level: 最大のブロック幅を2^max_level日とする
+        """
+
+        rows, days = [], []
+        for minutes_id, date in zip(minutes_ids, dates):
+            if minutes_id in term_stats:
+                rows.append(term_stats.key2row[minutes_id])
+                days.append(date.toordinal())
+        if not rows:
+            empty = term_stats.aggregate(np.zeros(0, dtype=np.int64), [], 0)
+            return cls(empty, 0, 0, [0])
+
+        first_day = min(days)
+        num_days = max(days) - first_day + 1
+        levels = [term_stats.aggregate(np.array(rows, dtype=np.int64), np.array(days) - first_day, num_days)]
+        while len(levels) <= max_level and levels[-1].num_rows > 1:
+            prev = levels[-1]
+            prev_rows = np.arange(prev.num_rows, dtype=np.int64)
+            levels.append(prev.aggregate(prev_rows, prev_rows // 2, (prev.num_rows + 1) // 2))
+        LOGGER.debug('built %s levels of daily term stats for %s days', len(levels), num_days)
+
+        level_offsets = np.cumsum([0] + [level.num_rows for level in levels[:-1]]).tolist()
+        entry_offsets = np.cumsum([0] + [len(level.indices) for level in levels[:-1]])
+        indptr = np.concatenate([levels[0].indptr[:1]] +
+                                [level.indptr[1:] + offset for level, offset in zip(levels, entry_offsets)])
+        blocks = TermStats(term_stats.terms, list(range(len(indptr) - 1)), indptr,
+                           np.concatenate([level.indices for level in levels]),
+                           np.concatenate([level.tfs for level in levels]),
+                           np.concatenate([level.tfidfs for level in levels]))
+        return cls(blocks, first_day, num_days, level_offsets)
+
+    def to_rows(self, start_date, end_date):
+        """
+        [start_date, end_date) を覆うブロックの行番号を日付順で返す
+        """
+
+        lo = min(max(start_date.toordinal() - self.first_day, 0), self.num_days)
+        hi = min(max(end_date.toordinal() - self.first_day, 0), self.num_days)
+        starts, rows = [], []
+        level = 0
+        while lo < hi:
+            offset = self.level_offsets[level]
+            if level == self.max_level:
+                starts.extend(i << level for i in range(lo, hi))
+                rows.extend(offset + i for i in range(lo, hi))
+                break
+            if lo & 1:
+                starts.append(lo << level)
+                rows.append(offset + lo)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                starts.append(hi << level)
+                rows.append(offset + hi)
+            lo >>= 1
+            hi >>= 1
+            level += 1
+        rows = [row for _, row in sorted(zip(starts, rows))]
+        return np.array(rows, dtype=np.int64)
+
+    def top_items(self, start_date, end_date, num_items):
+        return self.blocks.top_items(self.to_rows(start_date, end_date), num_items)
+
+    def top_arrays(self, start_date, end_date, num_items):
+        return self.blocks.top_arrays(self.to_rows(start_date, end_date), num_items)
+
+
+class SlidingTermStats:
+    """
+    DailyTermStatsの日ごとの行をterm毎の配列に加減算して、直前のwindowとの差分だけで次のwindowを求める。
+    重なったwindowを順に計算する場合、1 windowあたりのコストは変化した日数に比例する。
+    tfidfは他の計算方法と同じく合算の順序によって最後の数bitが異なることがある。同値の場合は他と同じくterm IDの順とする。
+    """
+
+    def __init__(self, daily_term_stats: DailyTermStats):
+        self.daily_term_stats = daily_term_stats
+        num_terms = daily_term_stats.blocks.num_terms
+        self.counts = np.zeros(num_terms, dtype=np.int64)  # number of days in the window which contain the term
+        self.tfs = np.zeros(num_terms, dtype=np.float64)
+        self.tfidfs = np.zeros(num_terms, dtype=np.float64)
+        self.lo = self.hi = 0  # current window as [lo, hi) days from first_day
+
+    def move(self, start_date, end_date):
+        """
+        windowを[start_date, end_date)に移動する。重ならない場合は0から計算し直す。
+        """
+
+        daily = self.daily_term_stats
+        lo = min(max(start_date.toordinal() - daily.first_day, 0), daily.num_days)
+        hi = min(max(end_date.toordinal() - daily.first_day, lo), daily.num_days)
+        if lo >= self.hi or hi <= self.lo:
+            self._update([(self.lo, self.hi, -1), (lo, hi, 1)])
+        else:
+            self._update([(self.lo, lo, -1), (hi, self.hi, -1), (lo, self.lo, 1), (self.hi, hi, 1)])
+        self.lo, self.hi = lo, hi
+
+    def top_arrays(self, num_items):
+        """
+        現在のwindowについてtfidfの上位num_items件を(term_ids, tfs, tfidfs)の配列で降順に返す
+        """
+
+        term_ids = np.flatnonzero(self.counts)
+        tfidfs = self.tfidfs[term_ids]
+        num_items = min(len(term_ids), num_items)
+        if num_items <= 0:
+            term_ids = term_ids[:0]
+        elif num_items < len(term_ids):
+            kth = np.partition(-tfidfs, num_items - 1)[num_items - 1]
+            candidates = np.flatnonzero(-tfidfs <= kth)
+            term_ids, tfidfs = term_ids[candidates], tfidfs[candidates]
+        order = np.lexsort((term_ids, -tfidfs))[:num_items]
+        term_ids, tfs, tfidfs = term_ids[order], self.tfs[term_ids[order]], tfidfs[order]
+        if self.daily_term_stats.blocks.tfs.dtype.kind == 'i':
+            tfs = np.rint(tfs).astype(np.int64)
+        return term_ids, tfs, tfidfs
+
+    def _update(self, ranges):
+        """
+        (lo, hi, sign)ごとに[lo, hi)日の行をsignの符号で加算する
+        """
+
+        ranges = [(lo, hi, sign) for lo, hi, sign in ranges if lo < hi]
+        if not ranges:
+            return
+        daily = self.daily_term_stats
+        rows = np.concatenate([np.arange(lo, hi, dtype=np.int64) for lo, hi, _ in ranges]) + daily.level_offsets[0]
+        row_signs = np.concatenate([np.full(hi - lo, sign, dtype=np.int64) for lo, hi, sign in ranges])
+        indices, tfs, tfidfs = daily.blocks.gather(rows)
+        signs = np.repeat(row_signs, daily.blocks.indptr[rows + 1] - daily.blocks.indptr[rows])
+        # np.add.at takes its fast path only when the dtypes match the accumulators
+        np.add.at(self.counts, indices, signs)
+        np.add.at(self.tfs, indices, (signs * tfs).astype(np.float64))
+        np.add.at(self.tfidfs, indices, signs * tfidfs)
+        # drop the rounding errors left by subtraction once a term leaves the window
+        removed = indices[(signs < 0) & (self.counts[indices] == 0)]
+        self.tfs[removed] = 0
+        self.tfidfs[removed] = 0
@@ -0,0 +1,30 @@
+"""
+tfidf.jsonをmmapで読み込めるバイナリ形式に変換する
+
+usage: python -m termstats.convert tfidf.json tfidf.bin
+"""
+
+import argparse
+import json
+import logging
+
+from termstats import TermStats
+
+LOGGER = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='tfidf.jsonをバイナリ形式に変換する')
+    parser.add_argument('json_fp', help='minutes_id -> {term: [tf, tfidf]} のJSONファイル')
+    parser.add_argument('bin_fp', help='出力するバイナリファイル')
+    args = parser.parse_args()
+
+    with open(args.json_fp, 'r') as f:
+        term_stats = TermStats.from_dict(json.load(f))
+    term_stats.save(args.bin_fp)
+    LOGGER.info('converted %s to %s', args.json_fp, args.bin_fp)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,30 @@
+"""
+api.wordcloud.parallel.WindowPoolのプロセスで実行する関数。
+apiをimportしないので、プロセスはFlaskのappを作らず、ログの設定やデータの読み込みも行わない。
+"""
+
+import os
+from collections import OrderedDict
+
+from termstats import DailyTermStats, TermStats
+
+MAX_WORKER_DAILY_TERM_STATS = 4
+
+# per worker process cache of the DailyTermStats opened from the shared files
+_fp2daily = OrderedDict()
+
+
+def calc_top_arrays(fp, first_day, num_days, level_offsets, windows, num_items):
+    daily_term_stats = _fp2daily.get(fp)
+    if daily_term_stats is None:
+        daily_term_stats = DailyTermStats(TermStats.load(fp), first_day, num_days, level_offsets)
+        _fp2daily[fp] = daily_term_stats
+        while len(_fp2daily) > MAX_WORKER_DAILY_TERM_STATS:
+            _fp2daily.popitem(last=False)
+    else:
+        _fp2daily.move_to_end(fp)
+    return [daily_term_stats.top_arrays(start_date, end_date, num_items) for start_date, end_date in windows]
+
+
+def get_pid():
+    return os.getpid()
@@ -0,0 +1,37 @@
+import orjson
+
+from api import app
+from api.batch.search import MAX_QUERIES
+from api.bill.search import search_bills
+
+
+def post_batch(queries):
+    response = app.test_client().post('/batch', json={'queries': queries})
+    return response.status_code, orjson.loads(response.data)
+
+
+def test_batch(fake_backends):
+    fake_es, _ = fake_backends
+    fake_es.num_docs['bill'] = 20000
+    status, responses = post_batch([
+        {'type': 'bills', 'params': {'q': '法律', 'items': 2}},
+        {'type': 'bills', 'params': {'items': 2, 'cursor': ''}},
+        {'type': 'members', 'params': {'items': 2, 'cursor': ''}},
+    ])
+    assert status == 200
+    assert [bill['id'] for bill in responses[0]['bills']] == ['Bill:0', 'Bill:1']
+    assert responses[1]['nextCursor'] and responses[2]['nextCursor']
+    assert fake_es.num_requests == 3  # two point in times and one _msearch
+
+    # the same total as /bills, bounded in the same way
+    assert responses[0]['totalBills'] == search_bills('法律', num_items=2)['totalBills'] == 10000
+
+
+def test_batch_invalid_queries(fake_backends):
+    fake_es, _ = fake_backends
+    status, response = post_batch([{'type': 'unknown'}])
+    assert status == 400
+    assert response['error'] == 'unknown query type: unknown'
+    status, _ = post_batch([{'type': 'bills'}] * (MAX_QUERIES + 1))
+    assert status == 400
+    assert fake_es.num_requests == 0
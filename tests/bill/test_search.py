@@ -0,0 +1,40 @@
+import orjson
+
+from api import app
+from api.bill.search import search_bills, export_bills, bill_cache
+
+
+def test_search_bills(fake_backends):
+    response = search_bills('法律', page=2, num_items=5)
+    assert response['totalBills'] == 1000
+    assert [bill['id'] for bill in response['bills']] == [f'Bill:{i}' for i in range(5, 10)]
+    bill = response['bills'][0]
+    assert bill['billNumberShort'] == '204-閣-1'
+    assert bill['totalPdfs'] == 2
+    assert '<b>' in bill['fragment']
+
+
+def test_search_bills_total(fake_backends, monkeypatch):
+    fake_es, _ = fake_backends
+    search_bills('法律', num_items=5)
+    assert fake_es.num_requests == 1  # the total comes from the search itself
+    monkeypatch.setitem(fake_es.num_docs, 'bill', 20000)
+    assert search_bills('法律', num_items=5)['totalBills'] == 10000
+
+
+def test_export_bills(fake_backends):
+    fake_es, fake_gql = fake_backends
+    records = list(export_bills(None, batch_size=300))
+    assert [record['id'] for record in records] == [f'Bill:{i}' for i in range(1000)]
+    assert records[0]['billNumberShort'] == '204-閣-1'
+    assert fake_gql.num_requests == 4  # one per batch
+    assert len(bill_cache.backend) == 0  # the export does not fill the cache
+
+
+def test_export_bills_api(fake_backends):
+    with app.test_client().get('/bills/export?category=0&fragment=50') as response:
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data().splitlines()
+    assert len(lines) == 1000
+    assert orjson.loads(lines[-1])['id'] == 'Bill:999'
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+# load nothing in the background when api is imported
+os.environ.setdefault('POLITYLINK_INIT_ON_IMPORT', 'false')
+
+import api.client
+from api.cache import CACHES
+from api.pagination import point_in_times
+from benchmarks.fakes import FakeElasticsearch, FakeGraphQLEndpoint
+
+
+def clear_caches():
+    for cache in CACHES:
+        cache.clear()
+    point_in_times.clear()
+
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    """
+    ElasticsearchとGraphQLをフェイクに置き換え、前後でキャッシュとpoint in timeを空にする
+
+    :return: (FakeElasticsearch, FakeGraphQLEndpoint)
+    """
+
+    fake_es, fake_gql = FakeElasticsearch(), FakeGraphQLEndpoint()
+    monkeypatch.setattr(api.client.es_client, 'client', fake_es)
+    monkeypatch.setattr(api.client.gql_client, 'endpoint', fake_gql)
+    clear_caches()
+    yield fake_es, fake_gql
+    clear_caches()
@@ -0,0 +1,65 @@
+import api.client
+import api.member.activity
+from api.member.activity import ActivityIndex
+from api.member.search import search_members, member_cache
+from benchmarks.fakes import FakeGraphQLEndpoint, build_gql_datetime
+
+
+class RecordingEndpoint(FakeGraphQLEndpoint):
+    def __init__(self):
+        super().__init__(num_members=3)
+        self.queries = []
+
+    def __call__(self, query, *args, **kwargs):
+        self.queries.append(str(query))
+        return super().__call__(query, *args, **kwargs)
+
+
+def test_search_members_activity(fake_backends, monkeypatch):
+    fake_gql = RecordingEndpoint()
+    monkeypatch.setattr(api.client.gql_client, 'endpoint', fake_gql)
+    activity_index = ActivityIndex()
+    monkeypatch.setattr('api.member.search.activity_index', activity_index)
+
+    # fallback to GraphQL while the index is cold
+    response = search_members(None, num_items=2)
+    assert response['members'][0]['activity']['date'] == '2021-03-10'
+    assert 'activities(first: 1, orderBy: [datetime_desc])' in fake_gql.queries[-1]
+
+    activity_index.refresh()
+    activity_index.refresh()  # incremental update without new activities
+    assert len(activity_index) == 3
+    member_cache.clear()
+    response = search_members(None, num_items=2)
+    assert response['members'][0]['activity']['date'] == '2021-03-10'
+    assert 'activities' not in fake_gql.queries[-1]
+
+
+def test_refresh_activity_index(monkeypatch):
+    fake_gql = RecordingEndpoint()
+    monkeypatch.setattr(api.client.gql_client, 'endpoint', fake_gql)
+    monkeypatch.setattr(api.member.activity, 'ACTIVITY_PAGE_SIZE', 2)
+    activity_index = ActivityIndex()
+    activity_index.refresh()
+    assert activity_index.get('Member:1')['date'] == '2021-03-10'
+
+    fake_gql.activities = [
+        {'memberId': 'Member:1', 'datetime': build_gql_datetime(10), 'bill': None, 'minutes': {'name': '予算委員会'}},
+        {'memberId': 'Member:0', 'datetime': build_gql_datetime(11), 'bill': None, 'minutes': {'name': '本会議'}},
+        {'memberId': 'Member:1', 'datetime': build_gql_datetime(12), 'bill': {'name': '法律案'}, 'minutes': None},
+    ]
+    activity_index.refresh()
+    assert activity_index.get('Member:0') == {'date': '2021-03-11', 'type': 'minutes', 'message': '本会議で発言しました'}
+    assert activity_index.get('Member:1') == {'date': '2021-03-12', 'type': 'bill', 'message': '法律案を提出しました'}
+    assert activity_index.get('Member:2')['date'] == '2021-03-10'
+    activity_queries = [query for query in fake_gql.queries if 'Activity(' in query]
+    assert len(activity_queries) == 2  # two pages
+    assert 'datetime_gte: {formatted: "2021-03-10T00:00:00"}' in activity_queries[0]
+    assert 'orderBy: [datetime_asc, id_asc]' in activity_queries[0]
+
+    # a full rebuild fetches the latest activity of every member again
+    activity_index.rebuild_interval = 0
+    num_queries = len(fake_gql.queries)
+    activity_index.refresh()
+    assert not any('Activity(' in query for query in fake_gql.queries[num_queries:])
+    assert activity_index.get('Member:1')['date'] == '2021-03-10'
@@ -0,0 +1,9 @@
+from api.member.search import export_members, member_cache
+
+
+def test_export_members(fake_backends):
+    _, fake_gql = fake_backends
+    records = list(export_members(None, batch_size=300))
+    assert [record['id'] for record in records] == [f'Member:{i}' for i in range(700)]
+    assert fake_gql.num_requests == 3  # one per batch
+    assert len(member_cache.backend) == 0
@@ -0,0 +1,23 @@
+from api.suggest.index import PrefixIndex, Suggester
+
+
+def test_prefix_index():
+    entries = ['bill0', 'bill1', 'bill2']
+    index = PrefixIndex(entries, [['地方自治法', 'ちほうじち'], ['地方税法', '税'], ['ゼイリシ法']])
+    assert index.search('地方', 5) == ['bill0', 'bill1']
+    assert index.search('地方', 1) == ['bill0']
+    assert index.search('ぜいりし', 5) == ['bill2']  # katakana matches hiragana
+    assert index.search('ｾﾞｲ', 5) == ['bill2']  # half width is normalized
+    assert index.search('', 5) == []
+
+
+def test_suggester(fake_backends):
+    fake_es, _ = fake_backends
+    fake_es.num_docs.update({'bill': 30, 'member': 30})
+    suggester = Suggester()
+    suggester.refresh()
+    response = suggester.suggest('204-閣-1', num_items=3)
+    assert [bill['id'] for bill in response['bills']] == ['Bill:0', 'Bill:9', 'Bill:10']
+    assert response['members'] == []
+    response = suggester.suggest('ぎいん2', num_items=20, types=['member'])
+    assert [member['nameHira'] for member in response['members']] == ['ぎいん2'] + [f'ぎいん{i}' for i in range(20, 30)]
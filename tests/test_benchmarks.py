@@ -0,0 +1,19 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_run_all_scenarios(tmp_path):
+    # benchmarks.run sets up the environment before importing api, so it runs in its own process
+    output_fp = tmp_path / 'result.json'
+    subprocess.run([sys.executable, '-m', 'benchmarks.run', '--iterations', '2', '--warmup', '0',
+                    '--num-minutes', '300', '--num-committees', '5', '--num-diets', '5', '--num-terms', '500',
+                    '--terms-per-minutes', '20', '--output', str(output_fp)], cwd=ROOT_DIR, check=True, timeout=300)
+    with open(output_fp) as f:
+        report = json.load(f)
+    assert 'bills_export' in report['scenarios']  # limited to one request at a time
+    for result in report['scenarios'].values():
+        assert result['iterations'] == 2 and result['responseBytes'] > 0
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import pytest
+
+from api import app
+from api.bill.search import search_bills
+from api.cache import EntityCache, LocalBackend, ResponseCache, build_cache_key
+
+
+def test_local_backend(monkeypatch):
+    now = [0]
+    monkeypatch.setattr('api.cache.time.monotonic', lambda: now[0])
+    backend = LocalBackend(max_size=2, ttl=10)
+    backend.set_many({'a': 1, 'b': 2})
+    assert backend.get_many(['a']) == {'a': 1}
+    backend.set_many({'c': 3})  # evicts b, the least recently used
+    assert backend.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+    now[0] = 10
+    assert backend.get_many(['a', 'c']) == {}
+    assert len(backend) == 0
+
+
+def test_entity_cache():
+    requested_ids = []
+
+    def fetch(ids):
+        requested_ids.append(ids)
+        return dict((id_, id_.lower()) for id_ in ids if id_ != 'Missing')
+
+    cache = EntityCache('test')
+    assert cache.get_or_fetch(['A', 'B', 'A'], fetch) == {'A': 'a', 'B': 'b'}
+    assert cache.get_or_fetch(['B', 'C', 'Missing'], fetch) == {'B': 'b', 'C': 'c'}
+    assert requested_ids == [['A', 'B'], ['C', 'Missing']]
+    assert cache.get_stats() == {'name': 'test', 'hits': 1, 'misses': 4, 'size': 3}
+
+
+def test_search_bills_cache(fake_backends):
+    _, fake_gql = fake_backends
+    search_bills('法律', num_items=5)
+    search_bills('法律', num_items=5)
+    assert fake_gql.num_requests == 1
+
+
+def test_response_cache():
+    cache = ResponseCache('test')
+    assert cache.get_or_compute('key', lambda: b'1') == b'1'
+    assert cache.get_or_compute('key', lambda: b'2') == b'1'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_response_cache_single_flight():
+    cache = ResponseCache('test')
+    started, release = Event(), Event()
+    num_calls = []
+
+    def compute():
+        num_calls.append(1)
+        started.set()
+        release.wait(timeout=10)
+        return b'response'
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(cache.get_or_compute, 'key', compute)
+        started.wait(timeout=10)
+        followers = [executor.submit(cache.get_or_compute, 'key', compute) for _ in range(3)]
+        release.set()
+        assert [future.result() for future in [leader] + followers] == [b'response'] * 4
+    assert len(num_calls) == 1
+
+
+def test_response_cache_error():
+    cache = ResponseCache('test')
+
+    def fail():
+        raise RuntimeError('search failed')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('key', fail)
+    assert cache.get_or_compute('key', lambda: b'1') == b'1'  # errors are not cached
+
+
+def test_build_cache_key():
+    assert build_cache_key({'q': 'a', 'status': [2, 1, 2]}) == build_cache_key({'status': [1, 2], 'q': 'a'})
+    assert build_cache_key({'q': 'a'}) != build_cache_key({'q': 'b'})
+
+
+def test_bills_response_cache(fake_backends):
+    fake_es, _ = fake_backends
+    client = app.test_client()
+    first = client.get('/bills?q=法律&status=2&status=1')
+    second = client.get('/bills?status=1&q=法律&status=2')
+    assert first.data == second.data
+    assert fake_es.num_requests == 1
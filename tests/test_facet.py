@@ -0,0 +1,73 @@
+import orjson
+import pytest
+
+import api.client
+from api import app
+from api.bill.search import search_bills
+from benchmarks.fakes import FakeElasticsearch
+
+
+class RecordingElasticsearch(FakeElasticsearch):
+    """
+    FakeElasticsearchに送られたsearchのbodyを記録する
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bodies = []
+
+    def search(self, body=None, index=None, **params):
+        self.bodies.append(dict(body or dict(), **params))
+        return super().search(body, index, **params)
+
+
+@pytest.fixture
+def fake_es(fake_backends, monkeypatch):
+    fake_es = RecordingElasticsearch()
+    monkeypatch.setattr(api.client.es_client, 'client', fake_es)
+    return fake_es
+
+
+def test_search_bills_facets(fake_es):
+    response = search_bills(None, statuses=[1], categories=[0], num_items=5, facets=['status'])
+    assert response['totalBills'] == 1000
+    assert response['facets']['status'][0] == {'value': 0, 'count': 200, 'label': '提出'}
+    assert fake_es.num_requests == 1  # no separate count request
+    body = fake_es.bodies[-1]
+    assert body['post_filter'] == {'bool': {'filter': [{'terms': {'status': [1]}}]}}
+    assert {'terms': {'category': [0]}} in body['query']['bool']['filter']
+
+
+def test_facets_with_cursor(fake_es):
+    first = search_bills(None, statuses=[1], categories=[0], num_items=5, cursor='', facets=['status'])
+    second = search_bills(None, statuses=[1], categories=[0], num_items=5, cursor=first['nextCursor'],
+                          facets=['status'])
+    assert [bill['id'] for bill in second['bills']] == [f'Bill:{i}' for i in range(5, 10)]
+    assert second['facets'] == first['facets']
+    assert second['totalBills'] == first['totalBills']
+
+    # every page keeps the post filter, so the pages are the same hits as without facets
+    first_body, second_body = fake_es.bodies[-2:]
+    assert 'search_after' not in first_body and second_body['search_after'] == [4, 'Bill:4']
+    assert second_body['pit'] == first_body['pit']
+    assert second_body['post_filter'] == first_body['post_filter'] == {
+        'bool': {'filter': [{'terms': {'status': [1]}}]}}
+
+
+def test_batch_facets(fake_es):
+    params = {'status': [1], 'category': [0], 'facet': ['status', 'category'], 'items': 2}
+    response = app.test_client().post('/batch', json={'queries': [{'type': 'bills', 'params': params}]})
+    assert response.status_code == 200
+    batch_response = orjson.loads(response.data)[0]
+    bills_response = orjson.loads(app.test_client().get('/bills', query_string=params).data)
+    assert batch_response['totalBills'] == bills_response['totalBills'] == 1000
+    assert batch_response['facets'] == bills_response['facets']
+
+
+def test_unknown_facet(fake_es):
+    response = app.test_client().get('/bills?facet=unknown')
+    assert response.status_code == 400
+    assert orjson.loads(response.data)['error'] == 'unknown facet: unknown'
+    response = app.test_client().post('/batch', json={'queries': [{'type': 'members', 'params': {'facet': ['x']}}]})
+    assert response.status_code == 400
+    assert fake_es.num_requests == 0
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import api.bill
+from api import app, limiter
+from api.limiter import ConcurrencyLimiter, OverloadedError, parse_limits
+
+
+@pytest.fixture
+def bills_limiter(fake_backends, monkeypatch):
+    bills_limiter = ConcurrencyLimiter('/bills', 1, 0, timeout=0.1)
+    monkeypatch.setitem(limiter.limiters, '/bills', bills_limiter)
+    return bills_limiter
+
+
+def test_parse_limits():
+    assert parse_limits('') == {}
+    assert parse_limits('/tf_idf=2:8, /bills=16:64,') == {'/tf_idf': (2, 8), '/bills': (16, 64)}
+
+
+def test_queue_full():
+    concurrency_limiter = ConcurrencyLimiter('/test', 1, 0)
+    concurrency_limiter.acquire()
+    with pytest.raises(OverloadedError) as e:
+        concurrency_limiter.acquire()
+    assert e.value.status == 429
+    assert concurrency_limiter.num_waiting == 0
+
+
+def test_timeout():
+    concurrency_limiter = ConcurrencyLimiter('/test', 1, 1, timeout=0.05)
+    concurrency_limiter.acquire()
+    with pytest.raises(OverloadedError) as e:
+        concurrency_limiter.acquire()
+    assert e.value.status == 503
+    assert concurrency_limiter.num_waiting == 0
+    concurrency_limiter.release()
+    concurrency_limiter.acquire()
+    assert concurrency_limiter.num_active == 1
+
+
+def test_overloaded_response(bills_limiter):
+    bills_limiter.acquire()
+    response = app.test_client().get('/bills')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    bills_limiter.release()
+    assert app.test_client().get('/bills').status_code == 200
+    assert bills_limiter.num_active == 0
+
+
+def test_release_on_error(bills_limiter, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError('search failed')
+
+    monkeypatch.setattr(api.bill, 'search_bills', fail)
+    assert app.test_client().get('/bills').status_code == 500
+    assert bills_limiter.num_active == 0
+
+
+def test_release_on_stream(fake_backends, monkeypatch):
+    export_limiter = ConcurrencyLimiter('/bills/export', 1, 0)
+    monkeypatch.setitem(limiter.limiters, '/bills/export', export_limiter)
+    client = app.test_client()
+    response = client.get('/bills/export', buffered=False)
+    # the first response is still streaming. a server handles each request in its own thread
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(client.get, '/bills/export').result().status_code == 429
+    response.get_data()
+    response.close()
+    assert export_limiter.num_active == 0
+    with client.get('/bills/export') as response:
+        assert response.status_code == 200
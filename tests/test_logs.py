@@ -0,0 +1,82 @@
+import logging
+import os
+from queue import SimpleQueue
+
+import pytest
+
+from api import logs
+from api.logs import AsyncLogger, RecordQueueHandler, parse_sample_rates, log_access
+
+REQUEST_INFO = {'method': 'GET', 'path': '/suggest', 'query': 'q=a'}
+
+
+class RecordCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.msg)
+
+
+@pytest.fixture
+def access_records(monkeypatch):
+    monkeypatch.setattr(logs, 'sample_rates', {'/suggest': 0.1, '/metrics': 0})
+    monkeypatch.setattr(logs.random, 'random', lambda: 0.5)
+    collector = RecordCollector()
+    logs.ACCESS_LOGGER.addHandler(collector)
+    yield collector.records
+    logs.ACCESS_LOGGER.removeHandler(collector)
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates('') == {}
+    assert parse_sample_rates('/suggest=0.1, /bills=0.5,') == {'/suggest': 0.1, '/bills': 0.5}
+
+
+def test_log_access(access_records):
+    log_access(0.01, {'route': '/suggest', 'status': 200}, REQUEST_INFO)
+    log_access(0.01, {'route': '/metrics', 'status': 200}, REQUEST_INFO)
+    assert access_records == []
+
+    log_access(0.01, {'route': '/bills', 'status': 200, 'timings': [('graphql', 0.002), ('graphql', 0.003)]},
+               REQUEST_INFO)
+    assert access_records[-1]['route'] == '/bills'
+    assert access_records[-1]['stages'] == {'graphql': 5.0}
+    assert access_records[-1]['sampleRate'] == 1
+
+
+def test_log_access_slow_or_failed(access_records):
+    log_access(logs.SLOW_REQUEST_SEC, {'route': '/suggest', 'status': 200}, REQUEST_INFO)
+    log_access(0.01, {'route': '/suggest', 'status': 503}, REQUEST_INFO)
+    assert [record['status'] for record in access_records] == [200, 503]
+    assert access_records[0]['sampleRate'] == 0.1
+
+
+def test_record_queue_handler():
+    queue_handler = RecordQueueHandler(SimpleQueue())
+    logger = logging.getLogger('tests.logs')
+    logger.addHandler(queue_handler)
+    try:
+        logger.warning('loaded %s', 'file')
+    finally:
+        logger.removeHandler(queue_handler)
+    record = queue_handler.queue.get_nowait()
+    assert (record.msg, record.args) == ('loaded %s', ('file',))
+
+
+def test_restart_after_fork(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, 'LOG_DIR', str(tmp_path))
+    logger = logging.getLogger('tests.logs.fork')
+    async_logger = AsyncLogger(logger, 'api.log', logging.Formatter('%(message)s'))
+    try:
+        async_logger.start()
+        logger.warning('parent')
+        async_logger.stop()
+        async_logger.restart_after_fork()  # as in a forked worker
+        logger.warning('worker')
+        async_logger.stop()
+    finally:
+        logger.removeHandler(async_logger.queue_handler)
+    assert (tmp_path / 'api.log').read_text() == 'parent\n'
+    assert (tmp_path / f'api.{os.getpid()}.log').read_text() == 'worker\n'
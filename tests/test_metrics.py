@@ -0,0 +1,55 @@
+import logging
+
+import pytest
+from flask import g
+
+from api import app, limiter, logs, metrics
+
+
+class RecordCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.msg)
+
+
+@pytest.fixture
+def access_records(fake_backends, monkeypatch):
+    fake_es, _ = fake_backends
+    fake_es.num_docs['bill'] = 250
+    monkeypatch.setitem(logs.sample_rates, '/bills/export', 1)
+    collector = RecordCollector()
+    logs.ACCESS_LOGGER.addHandler(collector)
+    yield collector.records
+    logs.ACCESS_LOGGER.removeHandler(collector)
+
+
+def test_streamed_request_is_finished(access_records):
+    response = app.test_client().get('/bills/export')
+    assert response.status_code == 200
+    assert len(response.get_data().splitlines()) == 250
+    response.close()
+    assert metrics.IN_FLIGHT._values[('/bills/export',)] == 0
+    assert limiter.limiters['/bills/export'].num_active == 0
+    record = access_records[-1]
+    assert record['route'] == '/bills/export'
+    assert {'elasticsearch', 'graphql', 'build'} <= set(record['stages'])
+
+
+def test_unread_streamed_request_is_finished(access_records):
+    response = app.test_client().get('/bills/export', buffered=False)
+    assert limiter.limiters['/bills/export'].num_active == 1
+    response.close()  # the client disconnects before the first chunk
+    assert metrics.IN_FLIGHT._values[('/bills/export',)] == 0
+    assert limiter.limiters['/bills/export'].num_active == 0
+    assert access_records[-1]['route'] == '/bills/export'
+
+
+def test_iter_stage():
+    timings = []
+    with app.test_request_context('/'):
+        g.timings = timings
+        assert list(metrics.iter_stage('test', iter(range(3)))) == [0, 1, 2]
+    assert [name for name, _ in timings] == ['test']
@@ -0,0 +1,39 @@
+import orjson
+import pytest
+
+import api.bill
+from api import app
+from api.bill.search import search_bills
+from api.pagination import decode_cursor, encode_cursor
+from api.utils import InvalidParameterError
+
+
+def test_search_bills_cursor(fake_backends):
+    first = search_bills(None, num_items=5, cursor='')
+    second = search_bills(None, num_items=5, cursor=first['nextCursor'])
+    assert [bill['id'] for bill in second['bills']] == [f'Bill:{i}' for i in range(5, 10)]
+
+
+def test_point_in_time_is_shared(fake_backends):
+    fake_es, _ = fake_backends
+    search_bills(None, num_items=5, cursor='')
+    search_bills('法律', num_items=5, cursor='')
+    assert fake_es.num_requests == 3  # one point in time and two searches
+
+
+def test_cursor_is_not_cached(fake_backends):
+    client = app.test_client()
+    num_hits = api.bill.response_cache.hits
+    for _ in range(2):
+        assert client.get('/bills?cursor=').status_code == 200
+    assert api.bill.response_cache.hits == num_hits
+
+
+def test_invalid_cursor(fake_backends):
+    assert decode_cursor(encode_cursor({'after': [1]})) == {'after': [1]}
+    for cursor in ['?', encode_cursor([1]), encode_cursor({'after': 1})]:
+        with pytest.raises(InvalidParameterError):
+            decode_cursor(cursor)
+    response = app.test_client().get('/bills?cursor=abc')
+    assert response.status_code == 400
+    assert 'invalid cursor' in orjson.loads(response.data)['error']
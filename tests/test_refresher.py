@@ -0,0 +1,38 @@
+from api.refresher import PeriodicRefresher
+
+
+class Counter(PeriodicRefresher):
+    def __init__(self, failures=0):
+        super().__init__('counter', refresh_interval=3600)
+        self.failures = failures
+        self.count = None
+
+    def is_ready(self):
+        return self.count is not None
+
+    def refresh(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('backend is down')
+        self.count = (self.count or 0) + 1
+
+
+def test_start():
+    counter = Counter()
+    counter.start(wait=True)
+    assert counter.count == 1
+    counter.start(wait=True)  # already started
+    assert counter.count == 1
+
+
+def test_start_does_not_block_on_failure():
+    counter = Counter(failures=1)
+    counter.start(wait=True)
+    assert not counter.is_ready()
+
+
+def test_start_after_refresh():
+    counter = Counter()
+    counter.refresh()  # e.g. in the master process before fork
+    counter.start(wait=True)
+    assert counter.count == 1  # the next refresh waits for the interval
@@ -0,0 +1,82 @@
+import time
+from threading import Event
+
+import pytest
+
+import api.wordcloud.dataset
+from api.wordcloud.dataset import Dataset, DatasetLoader
+from benchmarks.synthetic import generate_reference, generate_term_stats
+from termstats import TermStats
+
+
+@pytest.fixture
+def reference():
+    return generate_reference(num_minutes=300, num_committees=6, num_diets=3)
+
+
+@pytest.fixture
+def dataset(reference):
+    term_stats = generate_term_stats(reference.minutes_index.ids, num_terms=100, terms_per_minutes=10)
+    return Dataset(term_stats, reference.minutes_index, 1, None)
+
+
+def test_precompute_committees(reference, dataset, monkeypatch):
+    monkeypatch.setattr(api.wordcloud.dataset, 'MAX_CACHED_COMMITTEES', 2)
+    dataset.precompute(reference.all_diets, ['委員会0'])
+    diet = reference.all_diets[0]
+    for committee in ['委員会1', '委員会2', '委員会1', '委員会3']:
+        list(dataset.get_diet_top_items(diet, committee, 7, 10))
+    # the configured committee is kept, the others are evicted by the least recent use
+    assert dataset.get_cached_committees() == ['委員会0', '委員会1', '委員会3']
+
+
+def test_cached_top_items(reference, dataset, monkeypatch):
+    diet = reference.all_diets[0]
+    expected = list(dataset.get_diet_top_items(diet, '委員会1', 7, 10))
+    monkeypatch.setattr(dataset, '_calc_diet_top_arrays', None)  # fails unless the cached arrays are used
+    assert list(dataset.get_diet_top_items(diet, '委員会1', 7, 10)) == expected
+    assert len(expected[0][3]) == 10
+
+
+def test_reload(reference, tmp_path):
+    fp = str(tmp_path / 'tfidf.bin')
+    generate_term_stats(reference.minutes_index.ids, num_terms=100, terms_per_minutes=10).save(fp)
+    loader = DatasetLoader()
+    assert loader.reload(fp, reference, wait=True)
+    dataset = loader.current
+    assert (dataset.fp, dataset.version) == (fp, 1)
+    assert loader.get_status()['state'] == 'loaded'
+
+    # a file without any known minutes fails the validation and the current dataset is kept
+    invalid_fp = str(tmp_path / 'invalid.bin')
+    generate_term_stats(['Minutes:unknown'], num_terms=10, terms_per_minutes=5).save(invalid_fp)
+    assert not loader.reload(invalid_fp, reference, wait=True)
+    status = loader.get_status()
+    assert status['state'] == 'failed' and 'known minutes' in status['error']
+    assert status['current']['version'] == 1
+    assert loader.current is dataset
+
+
+def test_concurrent_reload_is_skipped(reference, tmp_path, monkeypatch):
+    fp = str(tmp_path / 'tfidf.bin')
+    generate_term_stats(reference.minutes_index.ids, num_terms=100, terms_per_minutes=10).save(fp)
+    started, release = Event(), Event()
+
+    def load_term_stats(fp):
+        started.set()
+        release.wait(timeout=10)
+        return TermStats.load(fp)
+
+    monkeypatch.setattr(api.wordcloud.dataset, 'load_term_stats', load_term_stats)
+    loader = DatasetLoader()
+    assert loader.reload(fp, reference)
+    started.wait(timeout=10)
+    assert not loader.reload(fp, reference)
+    assert loader.get_status()['state'] == 'loading'
+    release.set()
+    for _ in range(100):
+        if loader.get_status()['state'] != 'loading':
+            break
+        time.sleep(0.1)
+    assert loader.get_status()['state'] == 'loaded'
+    assert loader.current.version == 1
@@ -0,0 +1,40 @@
+from datetime import date, datetime, timedelta
+
+from api.wordcloud.minutes import MinutesIndex, to_datetime_dt
+from api.wordcloud.reference import Minutes
+from benchmarks.synthetic import generate_reference
+
+
+def get_target_minutes_ids(all_minutes, start_date, end_date, committee=None):
+    """
+    MinutesIndexに置き換える前の全件走査
+    """
+
+    return [minutes.id for minutes in all_minutes
+            if minutes.ndl_min_id and start_date <= to_datetime_dt(minutes.start_date_time) < end_date and
+            (committee is None or committee in minutes.name)]
+
+
+def test_get_minutes_ids():
+    reference = generate_reference(num_minutes=500, num_committees=5, num_diets=5)
+    minutes_index = MinutesIndex(reference.all_minutes, max_committees=2)
+    first_date = minutes_index.dates[0]
+    for start_date, end_date in [(first_date, first_date + timedelta(days=1)),
+                                 (first_date + timedelta(days=30), first_date + timedelta(days=200)),
+                                 (datetime(1999, 1, 1), datetime(2100, 1, 1))]:
+        for committee in [None, '委員会0', '委員会3', '委員会', '存在しない委員会']:
+            minutes_ids = minutes_index.get_minutes_ids(start_date, end_date, committee)
+            assert sorted(minutes_ids) == sorted(
+                get_target_minutes_ids(reference.all_minutes, start_date, end_date, committee))
+            dates = [minutes_index.dates[minutes_index.ids.index(minutes_id)] for minutes_id in minutes_ids]
+            assert dates == sorted(dates)
+
+
+def test_minutes_without_ndl_min_id():
+    all_minutes = [Minutes('Minutes:1', '1', '予算委員会', date(2021, 1, 2)),
+                   Minutes('Minutes:2', None, '予算委員会', date(2021, 1, 1)),
+                   Minutes('Minutes:3', '3', '本会議', date(2021, 1, 1))]
+    minutes_index = MinutesIndex(all_minutes)
+    assert len(minutes_index) == 2
+    assert minutes_index.get_minutes() == (['Minutes:3', 'Minutes:1'], [datetime(2021, 1, 1), datetime(2021, 1, 2)])
+    assert minutes_index.get_minutes('予算') == (['Minutes:1'], [datetime(2021, 1, 2)])
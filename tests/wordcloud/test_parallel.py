@@ -0,0 +1,55 @@
+import gc
+import os
+
+import numpy as np
+import pytest
+
+from api.wordcloud.dataset import Dataset
+from api.wordcloud.parallel import WindowPool
+from api.wordcloud.window import get_all_windows
+from benchmarks.synthetic import generate_reference, generate_term_stats
+
+
+def build_dataset():
+    reference = generate_reference(num_minutes=400, num_committees=20, num_diets=4)
+    term_stats = generate_term_stats(reference.minutes_index.ids, num_terms=100, terms_per_minutes=10)
+    return Dataset(term_stats, reference.minutes_index, 1, None)
+
+
+@pytest.fixture
+def dataset():
+    return build_dataset()
+
+
+@pytest.fixture(scope='module')
+def window_pool():
+    window_pool = WindowPool(2)
+    window_pool.warm_up()
+    yield window_pool
+    window_pool.shutdown()
+
+
+def test_iter_top_arrays(dataset, window_pool):
+    fp, daily_term_stats = dataset.get_shared_daily_term_stats()
+    dates = dataset.minutes_index.dates
+    windows = get_all_windows(dates[0], dates[-1], 7)
+    for (start_date, end_date), arrays in zip(windows, window_pool.iter_top_arrays(fp, daily_term_stats, windows, 10)):
+        for actual, expected in zip(arrays, daily_term_stats.top_arrays(start_date, end_date, 10)):
+            np.testing.assert_array_equal(actual, expected)
+
+
+def test_workers_do_not_start_app(window_pool):
+    modules = window_pool.get_executor().submit(eval, 'list(__import__("sys").modules)').result()
+    assert 'termstats.worker' in modules
+    assert 'api' not in modules and 'flask' not in modules
+
+
+def test_shared_files_live_with_dataset():
+    dataset = build_dataset()
+    committees = [None] + [f'委員会{i}' for i in range(20)]  # more than the cached DailyTermStats
+    fps = [dataset.get_shared_daily_term_stats(committee)[0] for committee in committees]
+    assert len(set(fps)) == len(fps) and all(os.path.exists(fp) for fp in fps)
+    assert dataset.get_shared_daily_term_stats()[0] == fps[0]
+    del dataset
+    gc.collect()
+    assert not any(os.path.exists(fp) for fp in fps)
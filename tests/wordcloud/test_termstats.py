@@ -0,0 +1,187 @@
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from politylink.utils import filter_dict_by_value
+
+from api.wordcloud.minutes import to_datetime_dt
+from api.wordcloud.window import get_all_windows
+from benchmarks.synthetic import generate_reference, generate_term_stats
+from termstats import FORMAT_VERSION, MAGIC, DailyTermStats, SlidingTermStats, TermStats, load_term_stats
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_tied_data():
+    reference = generate_reference(num_minutes=400, num_committees=5, num_diets=4)
+    term_stats = generate_term_stats([minutes.id for minutes in reference.all_minutes], num_terms=60,
+                                     terms_per_minutes=8)
+    term_stats.tfidfs = term_stats.tfs * 0.25  # many ties, and exact sums in any order
+    return reference, term_stats
+
+
+def calc_baseline(reference, term_stats, start_date, end_date, num_items):
+    """
+    merge_term_statsとfilter_dict_by_valueによる元の計算。同値はall_minutesで先に出現したtermを優先する。
+    """
+
+    merged = defaultdict(lambda: [0, 0])
+    for minutes in reference.all_minutes:
+        if minutes.id in term_stats and start_date <= to_datetime_dt(minutes.start_date_time) < end_date:
+            row = term_stats.key2row[minutes.id]
+            for i in range(term_stats.indptr[row], term_stats.indptr[row + 1]):
+                stats = merged[term_stats.terms[term_stats.indices[i]]]
+                stats[0] += int(term_stats.tfs[i])
+                stats[1] += float(term_stats.tfidfs[i])
+    return merged, filter_dict_by_value({t: s[1] for t, s in merged.items()}, num_items)
+
+
+def test_top_items_match_baseline_except_tie_order():
+    reference, term_stats = build_tied_data()
+    daily_term_stats = DailyTermStats.build(term_stats, *reference.minutes_index.get_minutes())
+    sliding_term_stats = SlidingTermStats(daily_term_stats)
+    term2id = dict((term, i) for i, term in enumerate(term_stats.terms))
+    dates = reference.minutes_index.dates
+    num_items = 10
+
+    windows = get_all_windows(dates[0], dates[-1], 7)
+    num_ties = 0
+    for start_date, end_date in windows:
+        merged, baseline_tfidfs = calc_baseline(reference, term_stats, start_date, end_date, num_items)
+        # the baseline with ties ordered by term ID instead of the order of all_minutes
+        expected = sorted(merged, key=lambda t: (-merged[t][1], term2id[t]))[:num_items]
+        expected_tfs = dict((t, merged[t][0]) for t in expected)
+        expected_tfidfs = dict((t, merged[t][1]) for t in expected)
+
+        rows = term_stats.to_rows(reference.minutes_index.get_minutes_ids(start_date, end_date))
+        sliding_term_stats.move(start_date, end_date)
+        for tfs, tfidfs in [term_stats.top_items(rows, num_items),
+                            daily_term_stats.top_items(start_date, end_date, num_items),
+                            term_stats.to_dicts(*sliding_term_stats.top_arrays(num_items))]:
+            assert list(tfidfs.items()) == list(expected_tfidfs.items())
+            assert list(tfs.items()) == list(expected_tfs.items())
+            # same values as the baseline, and only the terms tied at the last place can differ
+            assert list(tfidfs.values()) == list(baseline_tfidfs.values())
+            if baseline_tfidfs:
+                last = min(baseline_tfidfs.values())
+                assert set(t for t, v in tfidfs.items() if v > last) == \
+                       set(t for t, v in baseline_tfidfs.items() if v > last)
+        num_ties += list(expected_tfidfs) != list(baseline_tfidfs)
+    assert num_ties > 0  # the data has to exercise the tie-break
+
+
+def test_daily_term_stats_to_rows():
+    reference = generate_reference(num_minutes=300, num_committees=3, num_diets=3)
+    minutes_index = reference.minutes_index
+    term_stats = generate_term_stats(minutes_index.ids, num_terms=50, terms_per_minutes=8)
+    first_date, last_date = minutes_index.dates[0], minutes_index.dates[-1]
+    rng = random.Random(0)
+    ranges = [(first_date - timedelta(days=30), first_date),
+              (last_date + timedelta(days=1), last_date + timedelta(days=30)),
+              (first_date - timedelta(days=30), last_date + timedelta(days=30)), (last_date, first_date)]
+    for _ in range(50):
+        start_date = first_date + timedelta(days=rng.randint(-10, (last_date - first_date).days + 10))
+        ranges.append((start_date, start_date + timedelta(days=rng.randint(0, 200))))
+
+    for committee, max_level in [(None, 10), ('委員会1', 10), (None, 2)]:
+        daily_term_stats = DailyTermStats.build(term_stats, *minutes_index.get_minutes(committee), max_level=max_level)
+        for start_date, end_date in ranges:
+            # the blocks have to cover exactly the minutes of the requested days
+            actual = daily_term_stats.blocks.merge(daily_term_stats.to_rows(start_date, end_date))
+            minutes_ids = minutes_index.get_minutes_ids(start_date, end_date, committee)
+            expected = term_stats.merge(term_stats.to_rows(minutes_ids))
+            np.testing.assert_array_equal(actual[0], expected[0])
+            np.testing.assert_array_equal(actual[1], expected[1])
+            np.testing.assert_allclose(actual[2], expected[2])
+
+
+def test_empty_daily_term_stats():
+    term_stats = generate_term_stats(['Minutes:1'], num_terms=10, terms_per_minutes=5)
+    daily_term_stats = DailyTermStats.build(term_stats, ['Minutes:2'], [datetime(2021, 1, 1)])
+    assert len(daily_term_stats.to_rows(datetime(2020, 1, 1), datetime(2022, 1, 1))) == 0
+    assert daily_term_stats.top_items(datetime(2020, 1, 1), datetime(2022, 1, 1), 10) == ({}, {})
+
+
+def assert_same_term_stats(actual, expected):
+    assert list(actual.terms) == list(expected.terms)
+    assert list(actual.keys) == list(expected.keys)
+    for name in ['indptr', 'indices', 'tfs', 'tfidfs']:
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name))
+
+
+def test_save_and_load(tmp_path):
+    key2ts = {'Minutes:1': {'予算': [3, 1.5], '法律案': [1, 0.25]},
+              'Minutes:2': {},
+              'Minutes:3': {'法律案': [2, 0.5], '税': [5, 2.0]}}
+    term_stats = TermStats.from_dict(key2ts)
+    fp = tmp_path / 'tfidf.bin'
+    term_stats.save(fp)
+    loaded = TermStats.load(fp)
+    assert_same_term_stats(loaded, term_stats)
+    assert loaded.tfs.dtype == np.int32
+    assert loaded.to_dicts(*loaded.merge(loaded.to_rows(['Minutes:1', 'Minutes:3']))) == \
+           ({'予算': 3, '法律案': 3, '税': 5}, {'予算': 1.5, '法律案': 0.75, '税': 2.0})
+
+    # float tfs are kept as they are
+    term_stats = TermStats.from_dict({'Minutes:1': {'予算': [0.5, 1.5]}})
+    term_stats.save(fp)
+    assert TermStats.load(fp).tfs.tolist() == [0.5]
+
+
+def test_load_term_stats(tmp_path):
+    key2ts = dict((f'Minutes:{i}', {f'term{j}': [i + j, (i + j) / 4] for j in range(i % 5)}) for i in range(20))
+    json_fp, bin_fp = tmp_path / 'tfidf.json', tmp_path / 'tfidf.bin'
+    with open(json_fp, 'w') as f:
+        json.dump(key2ts, f)
+    # the converter runs without the app, which would write ./log and start loading the data
+    subprocess.run([sys.executable, '-c', 'import sys, termstats.convert; termstats.convert.main(); '
+                    'assert "api" not in sys.modules', str(json_fp), str(bin_fp)],
+                   cwd=tmp_path, env=dict(os.environ, PYTHONPATH=ROOT_DIR), check=True)
+    assert not (tmp_path / 'log').exists()
+    expected = TermStats.from_dict(key2ts)
+    assert_same_term_stats(load_term_stats(json_fp), expected)
+    assert_same_term_stats(load_term_stats(bin_fp), expected)
+
+
+def test_load_invalid_file(tmp_path):
+    fp = tmp_path / 'tfidf.bin'
+    fp.write_bytes(b'XXXX' + bytes(12))
+    with pytest.raises(ValueError, match='not a term stats file'):
+        TermStats.load(fp)
+    fp.write_bytes(struct.pack('<4sIQ', MAGIC, FORMAT_VERSION + 1, 0))
+    with pytest.raises(ValueError, match='unsupported term stats format version'):
+        TermStats.load(fp)
+
+
+def test_top_items_match_baseline_within_tolerance():
+    reference = generate_reference(num_minutes=400, num_committees=5, num_diets=4)
+    term_stats = generate_term_stats([minutes.id for minutes in reference.all_minutes], num_terms=60,
+                                     terms_per_minutes=8)
+    daily_term_stats = DailyTermStats.build(term_stats, *reference.minutes_index.get_minutes())
+    sliding_term_stats = SlidingTermStats(daily_term_stats)
+    dates = reference.minutes_index.dates
+    num_items = 10
+
+    num_inexact = 0
+    for start_date, end_date in get_all_windows(dates[0], dates[-1], 30):
+        merged, baseline_tfidfs = calc_baseline(reference, term_stats, start_date, end_date, num_items)
+        rows = term_stats.to_rows(reference.minutes_index.get_minutes_ids(start_date, end_date))
+        sliding_term_stats.move(start_date, end_date)
+        for tfs, tfidfs in [term_stats.top_items(rows, num_items),
+                            daily_term_stats.top_items(start_date, end_date, num_items),
+                            term_stats.to_dicts(*sliding_term_stats.top_arrays(num_items))]:
+            # every path sums in its own order, so the values only match the baseline up to the last bits
+            np.testing.assert_allclose(list(tfidfs.values()), list(baseline_tfidfs.values()), rtol=1e-9)
+            for term, tfidf in tfidfs.items():
+                assert tfs[term] == merged[term][0]
+                assert tfidf == pytest.approx(merged[term][1], rel=1e-9)
+            num_inexact += list(tfidfs.values()) != list(baseline_tfidfs.values())
+    assert num_inexact > 0  # the data has to exercise the rounding differences
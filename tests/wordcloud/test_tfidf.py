@@ -0,0 +1,127 @@
+import gc
+import os
+import signal
+from threading import Event
+from unittest.mock import ANY
+
+import orjson
+import pytest
+
+import api.wordcloud.tfidf as tfidf
+from api import app
+from api.member.search import activity_index
+from api.prefork import load_shared_data
+from api.suggest import suggester
+from api.wordcloud import reloader
+from api.wordcloud.dataset import DatasetLoader
+from benchmarks.synthetic import generate_reference, generate_term_stats
+
+
+@pytest.fixture
+def reference(tmp_path, monkeypatch):
+    reference = generate_reference(num_minutes=200, num_committees=3, num_diets=3)
+    fp = str(tmp_path / 'tfidf.bin')
+    generate_term_stats(reference.minutes_index.ids, num_terms=100, terms_per_minutes=10).save(fp)
+    monkeypatch.setattr(tfidf, 'JSON_FP', fp)
+    monkeypatch.setattr(tfidf, 'reference', None)
+    monkeypatch.setattr(tfidf, 'dataset_loader', DatasetLoader())
+    monkeypatch.setattr(tfidf, 'init_thread', None)
+    monkeypatch.setattr(tfidf, 'init_attempted', Event())
+    return reference
+
+
+def test_initialize_retries(reference, monkeypatch):
+    results = [ConnectionError('GraphQL is down'), reference]
+
+    def load_reference_data(*args):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(tfidf, 'load_reference_data', load_reference_data)
+    monkeypatch.setattr(tfidf, 'INIT_RETRY_INTERVAL', 0.2)
+    tfidf.initialize(wait=True)  # returns after the first attempt fails
+    assert not tfidf.is_ready()
+    tfidf.init_thread.join(timeout=10)
+    assert tfidf.is_ready()
+    assert results == []
+
+
+@pytest.mark.parametrize('params', [{'interval': 7},
+                                    {'interval': 14, 'step': 3, 'committee': '委員会1'},
+                                    {'interval': 1, 'unit': 'month', 'align': 'start'}])
+def test_stream_tfidfs(reference, monkeypatch, params):
+    monkeypatch.setattr(tfidf, 'load_reference_data', lambda *args: reference)
+    tfidf.initialize(wait=True, warm_up=False)
+    dates = reference.minutes_index.dates
+    params = dict(params, start=dates[0].strftime('%Y-%m-%d'), end=dates[-1].strftime('%Y-%m-%d'), items=10)
+    expected = tfidf.calc_tfidfs(params['start'], params['end'], params['interval'], 10,
+                                 committee=params.get('committee'), unit=params.get('unit', 'day'),
+                                 align=params.get('align', 'calendar'), step=params.get('step'))
+    assert len(expected) > 1
+    expected = orjson.loads(orjson.dumps(expected))
+
+    client = app.test_client()
+    response = client.post('/tf_idf', json=params)
+    assert orjson.loads(response.data) == expected
+
+    with client.post('/tf_idf', json=dict(params, stream=True)) as response:
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.data.decode().splitlines()
+    assert [orjson.loads(line) for line in lines] == expected
+
+    with client.post('/tf_idf', json=dict(params, stream=True), headers={'Accept': 'text/event-stream'}) as response:
+        assert response.mimetype == 'text/event-stream'
+        events = response.data.decode().split('\n\n')
+    assert events.pop() == ''
+    assert [orjson.loads(event.removeprefix('data: ')) for event in events] == expected
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    state_dir = tmp_path / 'state'
+    state_dir.mkdir()
+    monkeypatch.setattr(reloader, '_state_dir', str(state_dir))
+    monkeypatch.setattr(reloader, '_master_pid', os.getpid())
+    monkeypatch.setattr(suggester, 'refresh', lambda: None)
+    monkeypatch.setattr(activity_index, 'refresh', lambda: None)
+    yield state_dir
+    gc.unfreeze()
+
+
+def test_reload_in_worker(reference, state_dir, monkeypatch):
+    signals = []
+    monkeypatch.setattr(reloader, '_master_pid', os.getpid() + 1)  # as in a worker
+    monkeypatch.setattr(reloader.os, 'kill', lambda pid, sig: signals.append((pid, sig)))
+    assert tfidf.load_minutes_to_term_stats('/path/to/tfidf.bin')
+    assert signals == [(os.getpid() + 1, signal.SIGHUP)]
+    assert tfidf.dataset_loader.get_status()['state'] == 'empty'  # the worker does not load it by itself
+    monkeypatch.setattr(reloader, '_master_pid', os.getpid())
+    assert reloader.take_request()['file'] == '/path/to/tfidf.bin'
+    assert reloader.take_request() is None
+
+
+def test_reload_in_master(reference, state_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(tfidf, 'load_reference_data', lambda *args: reference)
+    load_shared_data()
+    assert reloader.read_status()['current']['version'] == 1
+
+    fp = str(tmp_path / 'new.bin')
+    generate_term_stats(reference.minutes_index.ids, num_terms=50, terms_per_minutes=5, seed=1).save(fp)
+    reloader.write_json('request.json', {'id': 10, 'file': fp})
+    load_shared_data()  # on_reload
+    assert reloader.wait_for(10)
+    assert not reloader.wait_for(9)  # superseded by the later request
+    assert tfidf.get_dataset().fp == fp
+
+    reloader.write_json('request.json', {'id': 11, 'file': str(tmp_path / 'missing.bin')})
+    load_shared_data()
+    assert not reloader.wait_for(11)
+    assert tfidf.get_dataset().fp == fp
+
+    # workers report the status of the master
+    monkeypatch.setattr(reloader, '_master_pid', os.getpid() + 1)
+    status = tfidf.get_load_status()
+    assert status['state'] == 'failed' and status['current'] == {'file': fp, 'version': 2, 'loadedAt': ANY}
+    assert 'request' not in status
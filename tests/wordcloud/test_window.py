@@ -0,0 +1,93 @@
+from datetime import date, datetime
+
+import pytest
+
+from api import app
+from api.utils import InvalidParameterError
+from api.wordcloud.reference import Diet
+from api.wordcloud.window import get_all_windows, to_default_interval
+
+
+def d(day_str):
+    return datetime.strptime(day_str, '%Y-%m-%d')
+
+
+def to_day_strs(windows):
+    return [(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')) for start_date, end_date in windows]
+
+
+def test_whole_range():
+    assert get_all_windows(d('2021-01-06'), d('2021-02-01')) == [(d('2021-01-06'), d('2021-02-01'))]
+
+
+def test_calendar_week():
+    # 2021-01-06 is Wednesday, windows start on Monday and are cut at start_date and end_date
+    assert to_day_strs(get_all_windows(d('2021-01-06'), d('2021-01-20'), 1, 'week')) == [
+        ('2021-01-06', '2021-01-11'), ('2021-01-11', '2021-01-18'), ('2021-01-18', '2021-01-20')]
+
+
+def test_calendar_month():
+    assert to_day_strs(get_all_windows(d('2021-01-15'), d('2021-04-10'), 1, 'month')) == [
+        ('2021-01-15', '2021-02-01'), ('2021-02-01', '2021-03-01'), ('2021-03-01', '2021-04-01'),
+        ('2021-04-01', '2021-04-10')]
+    # month windows of 2 are aligned to even month indices, i.e. January, March, ...
+    assert to_day_strs(get_all_windows(d('2021-02-15'), d('2021-05-01'), 2, 'month')) == [
+        ('2021-02-15', '2021-03-01'), ('2021-03-01', '2021-05-01')]
+
+
+def test_calendar_days():
+    # N day windows are counted from 0001-01-01, so they do not depend on start_date
+    windows = get_all_windows(d('2021-01-01'), d('2021-03-01'), 10)
+    assert all((start_date.toordinal() - 1) % 10 == 0 for start_date, _ in windows[1:])
+    assert windows[1:] == get_all_windows(windows[1][0], d('2021-03-01'), 10)
+
+
+def test_start():
+    assert to_day_strs(get_all_windows(d('2021-01-31'), d('2021-04-15'), 1, 'month', 'start')) == [
+        ('2021-01-31', '2021-02-28'), ('2021-02-28', '2021-03-31'), ('2021-03-31', '2021-04-15')]
+    assert to_day_strs(get_all_windows(d('2021-01-06'), d('2021-01-20'), 1, 'week', 'start')) == [
+        ('2021-01-06', '2021-01-13'), ('2021-01-13', '2021-01-20')]
+
+
+def test_step():
+    assert to_day_strs(get_all_windows(d('2021-01-01'), d('2021-01-05'), 2, 'day', 'start', 1)) == [
+        ('2021-01-01', '2021-01-03'), ('2021-01-02', '2021-01-04'), ('2021-01-03', '2021-01-05'),
+        ('2021-01-04', '2021-01-05')]
+
+
+def test_diet():
+    diets = [Diet(2, date(2021, 3, 1), date(2021, 3, 31)), Diet(1, date(2021, 1, 1), date(2021, 1, 31))]
+    assert to_day_strs(get_all_windows(d('2021-01-15'), d('2021-12-31'), 1, 'diet', diets=diets)) == [
+        ('2021-01-15', '2021-02-01'), ('2021-03-01', '2021-04-01')]
+
+
+def test_to_default_interval():
+    assert to_default_interval(0, 'month') == 0
+    assert to_default_interval(2, 'week') == 14
+    assert to_default_interval(2, 'week', step=1) is None
+    assert to_default_interval(1, 'month') is None
+    assert to_default_interval(7, align='start') is None
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'interval': -1},
+    {'interval': 1, 'step': -1},
+    {'interval': 1, 'unit': 'year'},
+    {'interval': 1, 'align': 'end'},
+    {'interval': 0, 'unit': 'year'},
+])
+def test_invalid_params(kwargs):
+    with pytest.raises(InvalidParameterError):
+        get_all_windows(d('2021-01-01'), d('2021-02-01'), **kwargs)
+
+
+@pytest.mark.parametrize('params', [
+    {'interval': -7},
+    {'interval': 7, 'step': -1},
+    {'interval': 'a'},
+    {'interval': 7, 'unit': 'year'},
+    {'interval': 7, 'align': 'end'},
+])
+def test_invalid_request(params):
+    params = dict({'start': '2021-01-01', 'end': '2021-02-01'}, **params)
+    assert app.test_client().post('/tf_idf', json=params).status_code == 400